@@ -3,9 +3,16 @@ BM25 Text Matching Service for Deep Search.
 Provides keyword-based matching for VLM descriptions.
 """
 from typing import List, Dict, Tuple
-import math
+import os
 import re
 from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+# Maximal runs of word characters; punctuation and whitespace both separate
+_TOKEN_RE = re.compile(r'\w+')
 
 class BM25Matcher:
     """BM25 algorithm for ranking text documents by relevance to a query."""
@@ -26,23 +33,31 @@ class BM25Matcher:
         self.doc_freqs = {}
         self.idf = {}
         self.doc_count = 0
+        # token -> column of the term-document weight matrix
+        self.vocab = {}
+        self._weights = csc_matrix((0, 0))
     
     def tokenize(self, text: str) -> List[str]:
         """Tokenize text into lowercase words."""
-        # Remove special characters and convert to lowercase
-        text = re.sub(r'[^\w\s]', ' ', text.lower())
-        # Split and filter empty strings
-        tokens = [word for word in text.split() if word]
-        return tokens
+        # One findall pass; same tokens as replacing punctuation with spaces and splitting
+        return _TOKEN_RE.findall(text.lower())
     
-    def index_documents(self, documents: List[str]):
+    def index_documents(self, documents: List[str]) -> bool:
         """
         Index documents for BM25 scoring.
         
         Args:
             documents: List of document strings (VLM descriptions)
+            
+        Returns:
+            True if the index was rebuilt, False if it already matched documents
         """
-        self.documents = documents
+        # Same corpus as the last call (repeat deep searches over an unchanged
+        # library): vocabulary, IDF and weights are all still valid
+        if self.doc_count and documents == self.documents:
+            return False
+        
+        self.documents = list(documents)
         self.doc_count = len(documents)
         
         # Tokenize all documents
@@ -52,18 +67,115 @@ class BM25Matcher:
         self.doc_lengths = [len(doc) for doc in tokenized_docs]
         self.avg_doc_length = sum(self.doc_lengths) / self.doc_count if self.doc_count > 0 else 0
         
-        # Calculate document frequencies
-        self.doc_freqs = {}
-        for doc_tokens in tokenized_docs:
-            unique_tokens = set(doc_tokens)
-            for token in unique_tokens:
-                self.doc_freqs[token] = self.doc_freqs.get(token, 0) + 1
+        # (doc, term, tf) triples of the sparse term-document matrix
+        self.vocab = {}
+        rows, cols, tfs = [], [], []
+        for doc_index, doc_tokens in enumerate(tokenized_docs):
+            for token, tf in Counter(doc_tokens).items():
+                rows.append(doc_index)
+                cols.append(self.vocab.setdefault(token, len(self.vocab)))
+                tfs.append(tf)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        tf = np.asarray(tfs, dtype=np.float64)
         
-        # Calculate IDF (Inverse Document Frequency)
-        self.idf = {}
-        for token, freq in self.doc_freqs.items():
-            # IDF formula: log((N - df + 0.5) / (df + 0.5) + 1)
-            self.idf[token] = math.log((self.doc_count - freq + 0.5) / (freq + 0.5) + 1)
+        # Calculate document frequencies and IDF (Inverse Document Frequency)
+        # IDF formula: log((N - df + 0.5) / (df + 0.5) + 1)
+        df = np.bincount(cols, minlength=len(self.vocab))
+        idf = np.log((self.doc_count - df + 0.5) / (df + 0.5) + 1)
+        self.doc_freqs = dict(zip(self.vocab, df.tolist()))
+        self.idf = dict(zip(self.vocab, idf.tolist()))
+        
+        # Store each term's full BM25 contribution per document, so scoring a
+        # query is a sparse column gather + matvec:
+        # IDF * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * (doc_length / avg_doc_length)))
+        # Column-major (CSC) makes each column a posting list, so a query only
+        # touches documents containing one of its terms
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float64)
+        length_norm = self.k1 * (1 - self.b + self.b * (doc_lengths[rows] / self.avg_doc_length))
+        weights = idf[cols] * (tf * (self.k1 + 1)) / (tf + length_norm)
+        # float32 contributions and int32 doc ids halve the bytes a posting scan reads
+        self._weights = csc_matrix(
+            (weights.astype(np.float32), (rows.astype(np.int32), cols.astype(np.int32))),
+            shape=(self.doc_count, len(self.vocab)),
+            dtype=np.float32
+        )
+        return True
+    
+    def save(self, path: Path):
+        """
+        Write the built index to an .npz file so a restart can skip tokenizing.
+        
+        Args:
+            path: Destination file (should end in .npz)
+        """
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            params=np.array([self.k1, self.b]),
+            documents=np.array(self.documents, dtype=str),
+            vocab=np.array(list(self.vocab), dtype=str),
+            doc_lengths=np.array(self.doc_lengths, dtype=np.int64),
+            doc_freqs=np.array(list(self.doc_freqs.values()), dtype=np.int64),
+            idf=np.array(list(self.idf.values()), dtype=np.float64),
+            data=self._weights.data,
+            indices=self._weights.indices,
+            indptr=self._weights.indptr
+        )
+        # Readers never see a half-written index
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> "BM25Matcher":
+        """
+        Restore an index written by save().
+        
+        Args:
+            path: .npz file written by save()
+            
+        Returns:
+            Matcher ready to search, without re-tokenizing any document
+        """
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            matcher = cls(k1=k1, b=b)
+            matcher.documents = data["documents"].tolist()
+            matcher.doc_count = len(matcher.documents)
+            matcher.doc_lengths = data["doc_lengths"].tolist()
+            matcher.avg_doc_length = sum(matcher.doc_lengths) / matcher.doc_count if matcher.doc_count > 0 else 0
+            
+            tokens = data["vocab"].tolist()
+            matcher.vocab = {token: i for i, token in enumerate(tokens)}
+            matcher.doc_freqs = dict(zip(tokens, data["doc_freqs"].tolist()))
+            matcher.idf = dict(zip(tokens, data["idf"].tolist()))
+            matcher._weights = csc_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=(matcher.doc_count, len(tokens))
+            )
+        return matcher
+    
+    def _query_terms(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Column ids of the query's indexed terms and how often each occurs in the query."""
+        counts = Counter(token for token in self.tokenize(query) if token in self.vocab)
+        cols = np.fromiter((self.vocab[token] for token in counts), dtype=np.int64, count=len(counts))
+        multiplicity = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return cols, multiplicity
+    
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        BM25 scores of every indexed document for a query.
+        
+        Args:
+            query: Search query string
+            
+        Returns:
+            Array of length doc_count (0 for documents sharing no term with the query)
+        """
+        cols, multiplicity = self._query_terms(query)
+        if cols.size == 0:
+            return np.zeros(self.doc_count, dtype=np.float32)
+        return self._weights[:, cols] @ multiplicity
     
     def score_document(self, query: str, doc_index: int) -> float:
         """
@@ -79,28 +191,10 @@ class BM25Matcher:
         if doc_index >= len(self.documents):
             return 0.0
         
-        query_tokens = self.tokenize(query)
-        doc_tokens = self.tokenize(self.documents[doc_index])
-        doc_length = self.doc_lengths[doc_index]
-        
-        # Count term frequencies in document
-        term_freqs = Counter(doc_tokens)
-        
-        score = 0.0
-        for token in query_tokens:
-            if token not in self.idf:
-                continue
-            
-            # Term frequency in document
-            tf = term_freqs.get(token, 0)
-            
-            # BM25 formula
-            # score += IDF * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * (doc_length / avg_doc_length)))
-            numerator = tf * (self.k1 + 1)
-            denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-            score += self.idf[token] * (numerator / denominator)
-        
-        return score
+        cols, multiplicity = self._query_terms(query)
+        if cols.size == 0:
+            return 0.0
+        return float(self._weights[doc_index, cols].toarray()[0] @ multiplicity)
     
     def search(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
         """
@@ -113,24 +207,29 @@ class BM25Matcher:
         Returns:
             List of (doc_index, score) tuples, sorted by score descending
         """
-        scores = []
-        for i in range(len(self.documents)):
-            score = self.score_document(query, i)
-            if score > 0:  # Only include documents with non-zero scores
-                scores.append((i, score))
+        scores = self.get_scores(query)
         
-        # Sort by score descending
-        scores.sort(key=lambda x: x[1], reverse=True)
+        # Only include documents with non-zero scores
+        matched = np.flatnonzero(scores > 0)
+        if top_k < matched.size:
+            matched = np.sort(matched[np.argpartition(-scores[matched], top_k)[:top_k]])
         
-        return scores[:top_k]
+        # Sort by score descending; ties keep document order
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
 
 
 # Singleton instance
 _bm25_matcher = None
 
 def get_bm25_matcher() -> BM25Matcher:
-    """Get or create BM25 matcher singleton."""
+    """Get or create BM25 matcher singleton, starting from the saved index if there is one."""
     global _bm25_matcher
     if _bm25_matcher is None:
-        _bm25_matcher = BM25Matcher()
+        import config
+        try:
+            _bm25_matcher = BM25Matcher.load(config.BM25_INDEX_PATH)
+        except (OSError, KeyError, ValueError):
+            # No saved index yet (or an unreadable one); the first search builds it
+            _bm25_matcher = BM25Matcher()
     return _bm25_matcher
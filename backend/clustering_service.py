@@ -31,99 +31,97 @@ class ClusteringService:
                 'outliers': int
             }
         """
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get all faces without cluster assignment
-        cursor.execute("""
-            SELECT id, face_embedding 
-            FROM faces 
-            WHERE cluster_id IS NULL
-        """)
-        rows = cursor.fetchall()
-        
-        if len(rows) == 0:
-            cursor.close()
-            conn.close()
-            return {
-                'total_faces': 0,
-                'clustered': 0,
-                'clusters_created': 0,
-                'outliers': 0
-            }
-        
-        # Extract face IDs and embeddings
-        face_ids = [row['id'] for row in rows]
-        embeddings = np.array([row['face_embedding'] for row in rows])
-        
-        print(f">> Clustering {len(face_ids)} faces...")
-        
-        # Compute cosine distance matrix
-        similarity_matrix = cosine_similarity(embeddings)
-        
-        # Clip similarity to [-1, 1] to avoid floating point errors
-        similarity_matrix = np.clip(similarity_matrix, -1.0, 1.0)
-        
-        # Convert to distance and ensure non-negative
-        distance_matrix = 1 - similarity_matrix
-        distance_matrix = np.maximum(distance_matrix, 0)  # Ensure no negative values
-        
-        # Run DBSCAN clustering
-        clustering = DBSCAN(
-            eps=self.eps,
-            min_samples=self.min_samples,
-            metric='precomputed'
-        )
-        labels = clustering.fit_predict(distance_matrix)
-        
-        # Process clustering results
-        unique_labels = set(labels)
-        clusters_created = 0
-        clustered_count = 0
-        outlier_count = 0
-        
-        for label in unique_labels:
-            if label == -1:
-                # Outliers (noise points)
-                outlier_count = np.sum(labels == -1)
-                continue
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             
-            # Get faces in this cluster
-            cluster_mask = labels == label
-            cluster_face_ids = [face_ids[i] for i, mask in enumerate(cluster_mask) if mask]
-            cluster_embeddings = embeddings[cluster_mask]
+            # Get all faces without cluster assignment
+            cursor.execute("""
+                SELECT id, face_embedding 
+                FROM faces 
+                WHERE cluster_id IS NULL
+            """)
+            rows = cursor.fetchall()
             
-            # Create new cluster
-            cluster_id = str(uuid.uuid4())
+            if len(rows) == 0:
+                cursor.close()
+                return {
+                    'total_faces': 0,
+                    'clustered': 0,
+                    'clusters_created': 0,
+                    'outliers': 0
+                }
             
-            # Compute representative embedding (mean of all faces)
-            representative_embedding = np.mean(cluster_embeddings, axis=0)
+            # Extract face IDs and embeddings
+            face_ids = [row['id'] for row in rows]
+            embeddings = np.array([row['face_embedding'] for row in rows])
             
-            # Find face closest to representative embedding
-            similarities = cosine_similarity([representative_embedding], cluster_embeddings)[0]
-            representative_idx = np.argmax(similarities)
-            representative_face_id = cluster_face_ids[representative_idx]
+            print(f">> Clustering {len(face_ids)} faces...")
             
-            # Insert cluster
-            cursor.execute("""
-                INSERT INTO face_clusters (id, name, representative_face_id, face_count)
-                VALUES (%s, %s, %s, %s)
-            """, (cluster_id, f"Person {clusters_created + 1}", representative_face_id, len(cluster_face_ids)))
+            # Compute cosine distance matrix
+            similarity_matrix = cosine_similarity(embeddings)
+            
+            # Clip similarity to [-1, 1] to avoid floating point errors
+            similarity_matrix = np.clip(similarity_matrix, -1.0, 1.0)
             
-            # Update faces with cluster_id
-            for face_id in cluster_face_ids:
+            # Convert to distance and ensure non-negative
+            distance_matrix = 1 - similarity_matrix
+            distance_matrix = np.maximum(distance_matrix, 0)  # Ensure no negative values
+            
+            # Run DBSCAN clustering
+            clustering = DBSCAN(
+                eps=self.eps,
+                min_samples=self.min_samples,
+                metric='precomputed'
+            )
+            labels = clustering.fit_predict(distance_matrix)
+            
+            # Process clustering results
+            unique_labels = set(labels)
+            clusters_created = 0
+            clustered_count = 0
+            outlier_count = 0
+            
+            for label in unique_labels:
+                if label == -1:
+                    # Outliers (noise points)
+                    outlier_count = np.sum(labels == -1)
+                    continue
+                
+                # Get faces in this cluster
+                cluster_mask = labels == label
+                cluster_face_ids = [face_ids[i] for i, mask in enumerate(cluster_mask) if mask]
+                cluster_embeddings = embeddings[cluster_mask]
+                
+                # Create new cluster
+                cluster_id = str(uuid.uuid4())
+                
+                # Compute representative embedding (mean of all faces)
+                representative_embedding = np.mean(cluster_embeddings, axis=0)
+                
+                # Find face closest to representative embedding
+                similarities = cosine_similarity([representative_embedding], cluster_embeddings)[0]
+                representative_idx = np.argmax(similarities)
+                representative_face_id = cluster_face_ids[representative_idx]
+                
+                # Insert cluster
                 cursor.execute("""
-                    UPDATE faces 
-                    SET cluster_id = %s 
-                    WHERE id = %s
-                """, (cluster_id, face_id))
+                    INSERT INTO face_clusters (id, name, representative_face_id, face_count)
+                    VALUES (%s, %s, %s, %s)
+                """, (cluster_id, f"Person {clusters_created + 1}", representative_face_id, len(cluster_face_ids)))
+                
+                # Update faces with cluster_id
+                for face_id in cluster_face_ids:
+                    cursor.execute("""
+                        UPDATE faces 
+                        SET cluster_id = %s 
+                        WHERE id = %s
+                    """, (cluster_id, face_id))
+                
+                clusters_created += 1
+                clustered_count += len(cluster_face_ids)
             
-            clusters_created += 1
-            clustered_count += len(cluster_face_ids)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
         
         stats = {
             'total_faces': len(face_ids),
@@ -149,38 +147,37 @@ class ClusteringService:
         if len(cluster_ids) < 2:
             raise ValueError("Need at least 2 clusters to merge")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Keep first cluster, merge others into it
-        primary_cluster_id = cluster_ids[0]
-        secondary_cluster_ids = cluster_ids[1:]
-        
-        # Update all faces from secondary clusters to primary cluster
-        for cluster_id in secondary_cluster_ids:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Keep first cluster, merge others into it
+            primary_cluster_id = cluster_ids[0]
+            secondary_cluster_ids = cluster_ids[1:]
+            
+            # Update all faces from secondary clusters to primary cluster
+            for cluster_id in secondary_cluster_ids:
+                cursor.execute("""
+                    UPDATE faces 
+                    SET cluster_id = %s 
+                    WHERE cluster_id = %s
+                """, (primary_cluster_id, cluster_id))
+            
+            # Delete secondary clusters
             cursor.execute("""
-                UPDATE faces 
-                SET cluster_id = %s 
-                WHERE cluster_id = %s
-            """, (primary_cluster_id, cluster_id))
-        
-        # Delete secondary clusters
-        cursor.execute("""
-            DELETE FROM face_clusters 
-            WHERE id = ANY(%s)
-        """, (secondary_cluster_ids,))
-        
-        # Update primary cluster name and face count
-        cursor.execute("""
-            UPDATE face_clusters 
-            SET name = %s,
-                face_count = (SELECT COUNT(*) FROM faces WHERE cluster_id = %s)
-            WHERE id = %s
-        """, (new_name, primary_cluster_id, primary_cluster_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+                DELETE FROM face_clusters 
+                WHERE id = ANY(%s)
+            """, (secondary_cluster_ids,))
+            
+            # Update primary cluster name and face count
+            cursor.execute("""
+                UPDATE face_clusters 
+                SET name = %s,
+                    face_count = (SELECT COUNT(*) FROM faces WHERE cluster_id = %s)
+                WHERE id = %s
+            """, (new_name, primary_cluster_id, primary_cluster_id))
+            
+            conn.commit()
+            cursor.close()
         
         return {
             'merged_cluster_id': primary_cluster_id,
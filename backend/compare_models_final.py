@@ -2,6 +2,7 @@
 Final comparison: SmolVLM 500M vs SmolVLM2 2.2B
 Shows complete descriptions side-by-side.
 """
+import perf_init  # noqa: F401  (sets torch perf flags before CUDA init)
 import sys
 from PIL import Image
 import torch
@@ -48,7 +49,7 @@ def test_both_models(image_path: str):
         generated_ids = model.generate(**inputs, max_new_tokens=150, do_sample=False, use_cache=True)
     gen_time_500m = time.time() - start
     
-    caption_500m = processor.batch_decode(generated_ids, skip_special_tokens=True)[0].split("Assistant:")[-1].strip()
+    caption_500m = processor.batch_decode(generated_ids[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)[0].strip()
     
     del model, processor
     torch.cuda.empty_cache()
@@ -71,7 +72,7 @@ def test_both_models(image_path: str):
         generated_ids = model.generate(**inputs, max_new_tokens=150, do_sample=False, use_cache=True)
     gen_time_2b = time.time() - start
     
-    caption_2b = processor.batch_decode(generated_ids, skip_special_tokens=True)[0].split("Assistant:")[-1].strip()
+    caption_2b = processor.batch_decode(generated_ids[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)[0].strip()
     
     # Results
     print("\n" + "="*80)
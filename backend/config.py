@@ -22,15 +22,31 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
 
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "2"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "16"))
 
 # Qdrant Configuration
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 QDRANT_COLLECTION = "clip_embeddings"
+# Vector quantization for per-user collections: int8, binary or none
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "int8").lower()
+# Face collections can use a coarser setting (e.g. binary); defaults to QDRANT_QUANTIZATION
+QDRANT_FACE_QUANTIZATION = os.getenv("QDRANT_FACE_QUANTIZATION", QDRANT_QUANTIZATION).lower()
+# Storage type of the original face vectors in new collections: float32 or float16
+# (float16 needs qdrant-client/server >= 1.9; ignored on older clients)
+QDRANT_FACE_DATATYPE = os.getenv("QDRANT_FACE_DATATYPE", "float32").lower()
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+# Segments above this many KB are memory-mapped instead of held on the heap
+QDRANT_MEMMAP_THRESHOLD_KB = int(os.getenv("QDRANT_MEMMAP_THRESHOLD_KB", "20000"))
+# Keep the HNSW graph on disk too (lowest RAM, slower cold searches)
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
 
 # Redis Configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
 
 # CLIP Model Configuration
 CLIP_MODEL = os.getenv("CLIP_MODEL", "ViT-L-14")
@@ -40,6 +56,36 @@ CLIP_PRETRAINED = os.getenv("CLIP_PRETRAINED", "openai")
 import torch
 DEVICE = os.getenv("DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
 
+# Compile the CLIP model and the VLM decode step with torch.compile (torch>=2.1); slower startup, faster inference
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "false").lower() == "true"
+
+# Max images per batched embedding forward pass in the upload worker
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# How long the worker waits for more images to fill a batch
+EMBED_BATCH_WAIT_MS = int(os.getenv("EMBED_BATCH_WAIT_MS", "100"))
+
+# How long a finished image waits for others to share its Qdrant upsert request
+UPSERT_BATCH_WAIT_MS = int(os.getenv("UPSERT_BATCH_WAIT_MS", "100"))
+
+# Max face crops per batched InceptionResnetV1 forward pass, and how long to wait to fill one
+FACE_BATCH_SIZE = int(os.getenv("FACE_BATCH_SIZE", "64"))
+FACE_BATCH_WAIT_MS = int(os.getenv("FACE_BATCH_WAIT_MS", "50"))
+
+# Text embeddings kept in memory, keyed by exact text (query terms and expansions repeat a lot)
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", "4096"))
+# The text embedding cache is saved here so restarts don't re-encode common queries
+TEXT_EMBEDDING_CACHE_PATH = Path(os.getenv("TEXT_EMBEDDING_CACHE_PATH", str(STORAGE_DIR.parent / "text_embedding_cache.npz")))
+# Save the cache after this many newly encoded texts
+TEXT_EMBEDDING_CACHE_FLUSH_EVERY = int(os.getenv("TEXT_EMBEDDING_CACHE_FLUSH_EVERY", "256"))
+
+# Where uploads are processed: "arq" (separate worker process) or "background" (in the API process)
+TASK_QUEUE = os.getenv("TASK_QUEUE", "arq").lower()
+
+# Per-user search result cache (exact and near-duplicate queries)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))  # Entries per user
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))  # Seconds
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.97"))  # Cosine threshold for a hit
+
 # Search Configuration
 TOP_K = 20  # Number of results to return
 SCORE_THRESHOLD = 0.20  # Minimum similarity score for normal search
@@ -57,9 +103,33 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 
 # VLM Configuration (SmolVLM2-2.2B for Deep Search)
 ENABLE_VLM = os.getenv("ENABLE_VLM", "true").lower() == "true"
+# SmolVLM checkpoint to caption with, e.g. HuggingFaceTB/SmolVLM-500M-Instruct on small GPUs
+VLM_MODEL_NAME = os.getenv("VLM_MODEL_NAME", "HuggingFaceTB/SmolVLM2-2.2B-Instruct")
+# Weight precision for the VLM: nf4 (4-bit), int8, bf16 or fp16
+VLM_DTYPE = os.getenv("VLM_DTYPE", "nf4").lower()
+# Pre-quantized AWQ/GPTQ SmolVLM2 checkpoint (HF repo or path); loaded with its own fused
+# int4 kernels instead of VLM_DTYPE, falling back to VLM_DTYPE if it fails to load
+VLM_PREQUANTIZED_MODEL = os.getenv("VLM_PREQUANTIZED_MODEL", "")
+# Images captioned per generate() call when reprocessing or uploading
+VLM_BATCH_SIZE = int(os.getenv("VLM_BATCH_SIZE", "4"))
+# How long an upload waits for other uploads to share its caption batch
+VLM_BATCH_WAIT_MS = int(os.getenv("VLM_BATCH_WAIT_MS", "100"))
+# Captions kept in memory, keyed by image content hash and prompt
+VLM_CAPTION_CACHE_SIZE = int(os.getenv("VLM_CAPTION_CACHE_SIZE", "10000"))
+# Local caption server (vlm_server.py) that keeps one VLM loaded for scripts
+VLM_SERVER_PORT = int(os.getenv("VLM_SERVER_PORT", "50055"))
+VLM_SERVER_AUTHKEY = os.getenv("VLM_SERVER_AUTHKEY", "media-search").encode()
+
+# Load models and run one warmup inference at startup instead of on first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# Reindex / VLM reprocess log progress once per this many images
+PROGRESS_BATCH_SIZE = int(os.getenv("PROGRESS_BATCH_SIZE", "50"))
 
 # Deep Search Hybrid Configuration
 # Combines BM25 keyword matching with CLIP semantic matching
 BM25_WEIGHT = 0.7  # Weight for keyword matching (precision)
 CLIP_WEIGHT = 0.3  # Weight for semantic matching (recall)
 MIN_BM25_SCORE = 0.15  # Minimum normalized BM25 score to filter weak matches
+# Prebuilt BM25 index over VLM descriptions, reused across restarts
+BM25_INDEX_PATH = Path(os.getenv("BM25_INDEX_PATH", str(STORAGE_DIR.parent / "bm25_index.npz")))
@@ -2,34 +2,125 @@
 Database initialization and connection management.
 Handles PostgreSQL and Qdrant vector database.
 """
-import psycopg2
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2.extras import RealDictCursor
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams
 import config
 
 
+# PostgreSQL connection pool singleton
+_db_pool = None
+
+
+def get_db_pool():
+    """Get or create the PostgreSQL connection pool singleton."""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ThreadedConnectionPool(
+            config.DB_POOL_MIN_CONN,
+            config.DB_POOL_MAX_CONN,
+            config.DATABASE_URL,
+            cursor_factory=RealDictCursor,
+            # TCP keepalives so pooled connections survive long idle
+            # stretches (e.g. between GPU-bound VLM iterations)
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10
+        )
+    return _db_pool
+
+
+@contextmanager
 def get_db_connection():
-    """Create a new PostgreSQL database connection."""
-    return psycopg2.connect(config.DATABASE_URL, cursor_factory=RealDictCursor)
+    """
+    Borrow a PostgreSQL connection from the pool.
+    
+    The connection is rolled back on error and always returned to the pool.
+    """
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
 
 
-def init_postgres():
-    """Initialize PostgreSQL schema."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Columns that used to be stored as text and their numeric target types
+NUMERIC_COLUMNS = [
+    ("faces", "bbox_x", "integer"),
+    ("faces", "bbox_y", "integer"),
+    ("faces", "bbox_width", "integer"),
+    ("faces", "bbox_height", "integer"),
+    ("images", "width", "integer"),
+    ("images", "height", "integer"),
+    ("images", "file_size", "bigint"),
+]
+
+
+def migrate_numeric_columns(cursor):
+    """Convert legacy text bbox/size columns to numeric types (idempotent)."""
+    for table, column, sql_type in NUMERIC_COLUMNS:
+        cursor.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = %s AND column_name = %s
+        """, (table, column))
+        row = cursor.fetchone()
+        if row and row['data_type'] in ("character varying", "text"):
+            cursor.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {sql_type} "
+                f"USING NULLIF({column}, '')::{sql_type}"
+            )
+            print(f">> Migrated {table}.{column} to {sql_type}")
+
+
+# Must match the WHERE clause of the /reprocess-vlm query so the planner can use it
+VLM_UNPROCESSED_PREDICATE = "NOT COALESCE(vlm_processed, FALSE) OR vlm_description IS NULL"
+
+
+def create_vlm_unprocessed_index(cursor):
+    """
+    Create a partial index covering only images still waiting for a VLM description.
     
+    Keeps the reprocess scan proportional to the backlog instead of the whole
+    table; once everything is processed the index is empty.
+    """
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS images (
-            id UUID PRIMARY KEY,
-            file_path TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT NOW()
-        )
+        SELECT COUNT(*) AS n FROM information_schema.columns
+        WHERE table_name = 'images' AND column_name IN ('vlm_processed', 'vlm_description')
     """)
+    if cursor.fetchone()['n'] < 2:
+        return
     
-    conn.commit()
-    cursor.close()
-    conn.close()
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS ix_images_vlm_unprocessed
+        ON images (created_at DESC)
+        WHERE {VLM_UNPROCESSED_PREDICATE}
+    """)
+
+
+def init_postgres():
+    """Initialize PostgreSQL schema."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                id UUID PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        
+        migrate_numeric_columns(cursor)
+        create_vlm_unprocessed_index(cursor)
+        
+        conn.commit()
+        cursor.close()
     print(">> PostgreSQL initialized")
 
 
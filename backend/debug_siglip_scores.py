@@ -5,7 +5,7 @@ Tests real image-text similarity and score calibration.
 import os
 import numpy as np
 from PIL import Image
-from services.embeddings import encode_text, encode_image, calibrate_siglip_score
+from services.embeddings import encode_texts, encode_image, calibrate_siglip_score, calibrate_siglip_scores
 
 # Test queries with expected good matches
 TEST_CASES = [
@@ -32,14 +32,19 @@ def analyze_image_text_similarity():
         print(f"❌ Image directory not found: {img_path}")
         return
     
-    files = [f for f in os.listdir(img_path) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
-    if not files:
+    # Only the first image is used, so stop scanning the directory at the first match
+    with os.scandir(img_path) as entries:
+        first_image = next(
+            (e.name for e in entries if e.is_file() and e.name.lower().endswith(('.jpg', '.png', '.jpeg'))),
+            None
+        )
+    if first_image is None:
         print(f"❌ No images found in {img_path}")
         return
     
     # Use first image
-    test_img_path = os.path.join(img_path, files[0])
-    print(f"📷 Testing with image: {files[0]}\n")
+    test_img_path = os.path.join(img_path, first_image)
+    print(f"📷 Testing with image: {first_image}\n")
     
     # Load and encode image
     test_img = Image.open(test_img_path).convert("RGB")
@@ -60,13 +65,11 @@ def analyze_image_text_similarity():
         "random words xyz", "test query"
     ]
     
-    scores = []
-    for query in queries_to_test:
-        q_emb = encode_text(query)
-        raw_sim = np.dot(img_emb, q_emb)
-        calibrated_sim = calibrate_siglip_score(raw_sim)
-        scores.append(raw_sim)
-        
+    # Embeddings come back L2-normalized, so one matrix-vector product gives every cosine
+    query_embeddings = encode_texts(queries_to_test)
+    scores = query_embeddings @ img_emb
+    calibrated_scores = calibrate_siglip_scores(scores)
+    for query, raw_sim, calibrated_sim in zip(queries_to_test, scores, calibrated_scores):
         print(f"Query: '{query:20}' | Raw: {raw_sim:7.4f} | Calibrated: {calibrated_sim:.4f}")
     
     print("\n" + "=" * 80)
@@ -80,7 +83,6 @@ def analyze_image_text_similarity():
     print(f"  Median: {np.median(scores):.4f}")
     
     # Calibrated versions
-    calibrated_scores = [calibrate_siglip_score(s) for s in scores]
     print(f"\nCalibrated similarity stats:")
     print(f"  Min: {min(calibrated_scores):.4f}")
     print(f"  Max: {max(calibrated_scores):.4f}")
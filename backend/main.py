@@ -6,21 +6,29 @@ from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uuid
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
 import io
 import numpy as np
 
 import config
-from database import init_databases, get_db_connection, get_qdrant_client
+from database import init_databases, get_db_connection, get_qdrant_client, VLM_UNPROCESSED_PREDICATE
 from embedding_service import get_embedding_service
 from redis_cache import get_redis_cache
 from search_helper import get_search_helper
+from vlm_service import get_vlm_service, caption_image
 from models import (
     UploadResponse, SearchRequest, SearchResponse, SearchResult,
     GalleryResponse, GalleryImage, PersonCluster, PeopleResponse, LabelPersonRequest
 )
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+reprocess_log = logging.getLogger("reprocess")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CLIP Media Search API",
@@ -51,7 +59,7 @@ async def startup_event():
     """Initialize databases and load CLIP model on startup."""
     print(">> Starting CLIP Media Search API...")
     init_databases()
-    get_embedding_service()  # Preload CLIP model
+    embedding_service = get_embedding_service()  # Preload CLIP model
     get_redis_cache()  # Initialize Redis cache
     
     # Preload face detection models to avoid 30-second delay on first upload
@@ -62,9 +70,35 @@ async def startup_event():
         print(f">> Warning: Face detection preload failed: {str(e)}")
         print(f">> Face detection will still work, but first upload may be slower")
     
+    # Preload VLM so the first Deep Search / reprocess request doesn't pay for it
+    vlm_service = None
+    if config.ENABLE_VLM:
+        vlm_service = get_vlm_service()
+    
+    # Run one dummy inference per model so cuDNN autotuning and CUDA
+    # context setup happen before the first user request
+    if config.WARMUP_ON_STARTUP:
+        try:
+            warmup_start = time.time()
+            dummy = Image.new("RGB", (384, 384))
+            embedding_service.encode_image(dummy)
+            embedding_service.encode_text("warmup")
+            if vlm_service is not None and vlm_service.is_available():
+                vlm_service.generate_caption(dummy)
+            print(f">> Model warmup done in {time.time() - warmup_start:.2f}s")
+        except Exception as e:
+            print(f">> Warning: Model warmup failed: {str(e)}")
+    
     print(">> API ready!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections on shutdown."""
+    await get_redis_cache().close()
+    get_qdrant_client().close()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -88,7 +122,6 @@ async def upload_image(file: UploadFile = File(...)):
     5. Store vector in Qdrant
     6. Cache embedding in Redis
     """
-    import time
     upload_start = time.time()
     
     try:
@@ -119,73 +152,78 @@ async def upload_image(file: UploadFile = File(...)):
         
         # Store in PostgreSQL
         db_start = time.time()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO images (id, file_path) VALUES (%s, %s)",
-            (image_id, str(file_path))
-        )
-        conn.commit()
-        db_time = time.time() - db_start
-        
-        # Detect faces and extract embeddings (with error handling)
-        faces = []
-        face_start = time.time()
-        try:
-            from face_service import get_face_service
-            face_service = get_face_service()
-            faces = face_service.detect_and_extract_faces(image)
-            
-            # Store each detected face
-            for face in faces:
-                face_id = str(uuid.uuid4())
-                bbox = face["bbox"]
-                
-                # Save face thumbnail
-                face_service.save_face_thumbnail(face["face_crop"], face_id)
-                
-                # Store face in database
-                cursor.execute(
-                    """INSERT INTO faces 
-                       (id, image_id, face_embedding, bbox_x, bbox_y, bbox_width, bbox_height, confidence)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                    (face_id, image_id, face["embedding"].tolist(), 
-                     bbox[0], bbox[1], bbox[2], bbox[3], face["confidence"])
-                )
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO images (id, file_path) VALUES (%s, %s)",
+                (image_id, str(file_path))
+            )
             conn.commit()
-        except Exception as e:
-            print(f">> Face detection error (upload will continue): {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Don't fail the upload, just skip face detection
+            db_time = time.time() - db_start
+            
+            # Detect faces and extract embeddings (with error handling)
+            faces = []
+            face_start = time.time()
+            try:
+                from face_service import get_face_service
+                face_service = get_face_service()
+                faces = face_service.detect_and_extract_faces(image)
+                
+                # Store each detected face
+                for face in faces:
+                    face_id = str(uuid.uuid4())
+                    bbox = face["bbox"]
+                    
+                    # Save face thumbnail
+                    face_service.save_face_thumbnail(face["face_crop"], face_id)
+                    
+                    # Store face in database
+                    cursor.execute(
+                        """INSERT INTO faces 
+                           (id, image_id, face_embedding, bbox_x, bbox_y, bbox_width, bbox_height, confidence)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                        (face_id, image_id, face["embedding"].tolist(), 
+                         bbox[0], bbox[1], bbox[2], bbox[3], face["confidence"])
+                    )
+                conn.commit()
+            except Exception as e:
+                print(f">> Face detection error (upload will continue): {str(e)}")
+                import traceback
+                traceback.print_exc()
+                # Don't fail the upload, just skip face detection
 
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            
+            conn.commit()
+            cursor.close()
         
         # Generate VLM description for Deep Search (with error handling)
         vlm_description = None
         if config.ENABLE_VLM:
             try:
-                from vlm_service import get_vlm_service
                 vlm_service = get_vlm_service()
                 
                 if vlm_service.is_available():
-                    print(f">> Generating VLM description for {image_id}...")
-                    vlm_description = vlm_service.generate_caption(image)
+                    # Re-uploads of the same file reuse its caption instead of re-running the VLM
+                    redis_cache = get_redis_cache()
+                    content_hash = hashlib.blake2b(contents, digest_size=16).hexdigest()
+                    vlm_description = await redis_cache.get_caption(content_hash)
+                    
+                    if vlm_description is None:
+                        print(f">> Generating VLM description for {image_id}...")
+                        vlm_description = await caption_image(image)
+                        if vlm_description:
+                            await redis_cache.set_caption(content_hash, vlm_description)
                     
                     if vlm_description:
                         # Store VLM description in database
-                        conn = get_db_connection()
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "UPDATE images SET vlm_description = %s, vlm_processed = TRUE WHERE id = %s",
-                            (vlm_description, image_id)
-                        )
-                        conn.commit()
-                        cursor.close()
-                        conn.close()
+                        with get_db_connection() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute(
+                                "UPDATE images SET vlm_description = %s, vlm_processed = TRUE WHERE id = %s",
+                                (vlm_description, image_id)
+                            )
+                            conn.commit()
+                            cursor.close()
                         print(f">> VLM description: {vlm_description[:100]}...")
             except Exception as e:
                 print(f">> ⚠️  VLM description generation failed (upload will continue): {str(e)}")
@@ -207,7 +245,7 @@ async def upload_image(file: UploadFile = File(...)):
         
         # Cache embedding in Redis
         redis_cache = get_redis_cache()
-        redis_cache.set_embedding(image_id, image_embedding)
+        await redis_cache.set_embedding(image_id, image_embedding)
         
         total_time = time.time() - upload_start
         face_time = time.time() - face_start
@@ -231,16 +269,15 @@ async def upload_image(file: UploadFile = File(...)):
 async def get_gallery():
     """Get all images in the gallery with metadata."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, file_path, created_at
-            FROM images 
-            ORDER BY created_at DESC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, file_path, created_at
+                FROM images 
+                ORDER BY created_at DESC
+            """)
+            rows = cursor.fetchall()
+            cursor.close()
         
         images = []
         for row in rows:
@@ -262,41 +299,39 @@ async def get_gallery():
 async def delete_images(image_ids: list[str]):
     """Delete multiple images by their IDs."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        qdrant_client = get_qdrant_client()
-        redis_cache = get_redis_cache()
-        
-        deleted_count = 0
-        
-        for image_id in image_ids:
-            # Get file path
-            cursor.execute("SELECT file_path FROM images WHERE id = %s", (image_id,))
-            row = cursor.fetchone()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            qdrant_client = get_qdrant_client()
+            redis_cache = get_redis_cache()
             
-            if row:
-                # Delete file from disk
-                file_path = Path(row['file_path'])
-                if file_path.exists():
-                    file_path.unlink()
+            # Get file paths for all requested images in one query
+            cursor.execute("SELECT id, file_path FROM images WHERE id = ANY(%s::uuid[])", (image_ids,))
+            rows = cursor.fetchall()
+            found_ids = [row['id'] for row in rows]
+            
+            if found_ids:
+                # Delete files from disk
+                for row in rows:
+                    file_path = Path(row['file_path'])
+                    if file_path.exists():
+                        file_path.unlink()
                 
                 # Delete from PostgreSQL
-                cursor.execute("DELETE FROM images WHERE id = %s", (image_id,))
+                cursor.execute("DELETE FROM images WHERE id = ANY(%s::uuid[])", (found_ids,))
                 
-                # Delete from Qdrant
+                # Delete from Qdrant in a single request
                 qdrant_client.delete(
                     collection_name=config.QDRANT_COLLECTION,
-                    points_selector=[image_id]
+                    points_selector=found_ids
                 )
                 
                 # Delete from Redis cache
-                redis_cache.delete_embedding(image_id)
-                
-                deleted_count += 1
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+                await redis_cache.delete_embeddings(found_ids)
+            
+            deleted_count = len(found_ids)
+            
+            conn.commit()
+            cursor.close()
         
         return {
             "message": f"Successfully deleted {deleted_count} image(s)",
@@ -352,63 +387,61 @@ async def search_images(request: SearchRequest):
     """
     try:
         # First, check if query matches a person name
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Search for person by name (case-insensitive, partial match)
-        cursor.execute("""
-            SELECT id, name FROM face_clusters 
-            WHERE LOWER(name) LIKE LOWER(%s)
-            LIMIT 1
-        """, (f"%{request.query}%",))
-        
-        person_match = cursor.fetchone()
-        
-        if person_match:
-            # Found a person match - return all images containing this person
-            cluster_id = person_match['id']
-            person_name = person_match['name']
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             
-            print(f">> Person search: '{request.query}' matched '{person_name}'")
-            
-            try:
-                cursor.execute("""
-                    SELECT DISTINCT i.id, i.file_path, i.created_at
-                    FROM images i
-                    JOIN faces f ON f.image_id = i.id
-                    WHERE f.cluster_id = %s
-                    ORDER BY i.created_at DESC
-                """, (cluster_id,))
-                
-                rows = cursor.fetchall()
-                print(f">> Found {len(rows)} images for person '{person_name}'")
-            except Exception as e:
-                print(f">> Error executing person search query: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                raise
+            # Search for person by name (case-insensitive, partial match)
+            cursor.execute("""
+                SELECT id, name FROM face_clusters 
+                WHERE LOWER(name) LIKE LOWER(%s)
+                LIMIT 1
+            """, (f"%{request.query}%",))
             
-            cursor.close()
-            conn.close()
+            person_match = cursor.fetchone()
             
-            results = []
-            for row in rows:
-                results.append(SearchResult(
-                    image_id=row['id'],
-                    image_url=f"/images/{row['id']}.jpg",
-                    score=1.0,  # Perfect match for person search
-                    global_score=1.0,
-                    local_score=1.0
-                ))
+            if person_match:
+                # Found a person match - return all images containing this person
+                cluster_id = person_match['id']
+                person_name = person_match['name']
+                
+                print(f">> Person search: '{request.query}' matched '{person_name}'")
+                
+                try:
+                    cursor.execute("""
+                        SELECT DISTINCT i.id, i.file_path, i.created_at
+                        FROM images i
+                        JOIN faces f ON f.image_id = i.id
+                        WHERE f.cluster_id = %s
+                        ORDER BY i.created_at DESC
+                    """, (cluster_id,))
+                    
+                    rows = cursor.fetchall()
+                    print(f">> Found {len(rows)} images for person '{person_name}'")
+                except Exception as e:
+                    print(f">> Error executing person search query: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    raise
+                
+                cursor.close()
+                
+                results = []
+                for row in rows:
+                    results.append(SearchResult(
+                        image_id=row['id'],
+                        image_url=f"/images/{row['id']}.jpg",
+                        score=1.0,  # Perfect match for person search
+                        global_score=1.0,
+                        local_score=1.0
+                    ))
+                
+                return SearchResponse(
+                    query=request.query,
+                    results=results,
+                    total=len(results)
+                )
             
-            return SearchResponse(
-                query=request.query,
-                results=results,
-                total=len(results)
-            )
-        
-        cursor.close()
-        conn.close()
+            cursor.close()
         
         # No person match - proceed with CLIP semantic search
         embedding_service = get_embedding_service()
@@ -452,12 +485,11 @@ async def search_images(request: SearchRequest):
                 global_score = result.score
                 
                 # Load image for local scoring
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT file_path FROM images WHERE id = %s", (image_id,))
-                row = cursor.fetchone()
-                cursor.close()
-                conn.close()
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT file_path FROM images WHERE id = %s", (image_id,))
+                    row = cursor.fetchone()
+                    cursor.close()
                 
                 if not row:
                     continue
@@ -497,7 +529,9 @@ async def search_images(request: SearchRequest):
             
             # Diversity-based re-ranking
             diverse_results = []
-            used_embeddings = []
+            # Selected embeddings, one row each; filled as results are picked
+            used_matrix = None
+            used_count = 0
             
             redis_cache = get_redis_cache()
             
@@ -505,16 +539,15 @@ async def search_images(request: SearchRequest):
                 image_id = item['image_id']
                 
                 # Try to get embedding from Redis cache
-                img_embedding = redis_cache.get_embedding(image_id)
+                img_embedding = await redis_cache.get_embedding(image_id)
                 
                 # If not cached, load and encode image
                 if img_embedding is None:
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT file_path FROM images WHERE id = %s", (image_id,))
-                    row = cursor.fetchone()
-                    cursor.close()
-                    conn.close()
+                    with get_db_connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute("SELECT file_path FROM images WHERE id = %s", (image_id,))
+                        row = cursor.fetchone()
+                        cursor.close()
                     
                     if not row:
                         continue
@@ -527,19 +560,19 @@ async def search_images(request: SearchRequest):
                     img_embedding = embedding_service.encode_image(image)
                     
                     # Cache it for next time
-                    redis_cache.set_embedding(image_id, img_embedding)
+                    await redis_cache.set_embedding(image_id, img_embedding)
                 
-                # Check diversity
+                # Check diversity against the closest already-selected image
                 is_diverse = True
-                for used_emb in used_embeddings:
-                    similarity = np.dot(img_embedding, used_emb)
-                    if similarity > 0.95:  # Too similar
-                        is_diverse = False
-                        break
+                if used_count and (used_matrix[:used_count] @ img_embedding).max() > 0.95:  # Too similar
+                    is_diverse = False
                 
                 if is_diverse:
                     diverse_results.append(item)
-                    used_embeddings.append(img_embedding)
+                    if used_matrix is None:
+                        used_matrix = np.empty((request.top_k, len(img_embedding)), dtype=np.float32)
+                    used_matrix[used_count] = img_embedding
+                    used_count += 1
                 
                 # Stop when we have enough
                 if len(diverse_results) >= request.top_k:
@@ -596,7 +629,6 @@ async def deep_search_images(request: SearchRequest):
     6. Return top-k matches
     """
     try:
-        from vlm_service import get_vlm_service
         from bm25_matcher import get_bm25_matcher
         
         vlm_service = get_vlm_service()
@@ -611,17 +643,16 @@ async def deep_search_images(request: SearchRequest):
         bm25_matcher = get_bm25_matcher()
         
         # Retrieve all images with VLM descriptions
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, file_path, vlm_description, created_at
-            FROM images
-            WHERE vlm_processed = TRUE AND vlm_description IS NOT NULL
-            ORDER BY created_at DESC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, file_path, vlm_description, created_at
+                FROM images
+                WHERE vlm_processed = TRUE AND vlm_description IS NOT NULL
+                ORDER BY created_at DESC
+            """)
+            rows = cursor.fetchall()
+            cursor.close()
         
         if not rows:
             return SearchResponse(
@@ -634,8 +665,9 @@ async def deep_search_images(request: SearchRequest):
         descriptions = [row['vlm_description'] for row in rows]
         image_ids = [row['id'] for row in rows]
         
-        # Index descriptions with BM25
-        bm25_matcher.index_documents(descriptions)
+        # Index descriptions with BM25; persist rebuilds so a restart starts warm
+        if bm25_matcher.index_documents(descriptions):
+            bm25_matcher.save(config.BM25_INDEX_PATH)
         
         # Encode query for CLIP
         query_embedding = embedding_service.encode_text(request.query)
@@ -643,28 +675,29 @@ async def deep_search_images(request: SearchRequest):
         # Compute hybrid scores
         results_with_scores = []
         
-        # Get BM25 scores for all documents
-        bm25_results = bm25_matcher.search(request.query, top_k=len(descriptions))
-        bm25_scores_dict = {idx: score for idx, score in bm25_results}
+        # Get BM25 scores for all documents; every row is read below, so no ranking
+        bm25_scores = bm25_matcher.get_scores(request.query)
         
         # Normalize BM25 scores to 0-1 range
-        max_bm25_score = max(bm25_scores_dict.values()) if bm25_scores_dict else 1.0
+        max_bm25_score = float(bm25_scores.max()) if bm25_scores.size else 0.0
+        if max_bm25_score > 0:
+            bm25_scores = bm25_scores / max_bm25_score
+        
+        # Filter out weak keyword matches (e.g., single-word match in multi-word query)
+        keep = np.flatnonzero(bm25_scores >= config.MIN_BM25_SCORE)
+        
+        # Get CLIP scores (semantic matching): encode the surviving descriptions
+        # in batches and score them all with one matrix-vector product
+        if keep.size:
+            desc_embeddings = embedding_service.encode_texts([descriptions[i] for i in keep])
+            clip_scores = desc_embeddings @ np.asarray(query_embedding, dtype=np.float32)
+        else:
+            clip_scores = np.empty(0, dtype=np.float32)
         
-        for i, row in enumerate(rows):
-            image_id = row['id']
-            description = row['vlm_description']
-            
-            # Get BM25 score (keyword matching)
-            bm25_score = bm25_scores_dict.get(i, 0.0)
-            bm25_normalized = bm25_score / max_bm25_score if max_bm25_score > 0 else 0.0
-            
-            # Filter out weak keyword matches (e.g., single-word match in multi-word query)
-            if bm25_normalized < config.MIN_BM25_SCORE:
-                continue
-            
-            # Get CLIP score (semantic matching)
-            desc_embedding = embedding_service.encode_text(description)
-            clip_score = float(np.dot(query_embedding, desc_embedding))
+        for i, clip_score in zip(keep.tolist(), clip_scores.tolist()):
+            image_id = rows[i]['id']
+            description = descriptions[i]
+            bm25_normalized = float(bm25_scores[i])
             
             # Hybrid score: 70% BM25 + 30% CLIP
             hybrid_score = (config.BM25_WEIGHT * bm25_normalized) + (config.CLIP_WEIGHT * clip_score)
@@ -712,17 +745,16 @@ async def deep_search_images(request: SearchRequest):
 async def get_people():
     """Get all face clusters (people) with metadata."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, name, representative_face_id, face_count, created_at
-            FROM face_clusters
-            ORDER BY face_count DESC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, name, representative_face_id, face_count, created_at
+                FROM face_clusters
+                ORDER BY face_count DESC
+            """)
+            rows = cursor.fetchall()
+            cursor.close()
         
         people = []
         for row in rows:
@@ -746,68 +778,65 @@ async def get_people():
 async def label_person(cluster_id: str, request: LabelPersonRequest):
     """Assign a name to a face cluster. If another cluster has the same name, merge them."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if another cluster already has this name
-        cursor.execute("""
-            SELECT id, face_count, representative_face_id 
-            FROM face_clusters 
-            WHERE name = %s AND id != %s
-        """, (request.name, cluster_id))
-        
-        existing_cluster = cursor.fetchone()
-        
-        if existing_cluster:
-            # Merge clusters: move all faces from current cluster to existing cluster
-            existing_cluster_id = existing_cluster['id']
-            
-            print(f">> Merging cluster {cluster_id} into {existing_cluster_id} (both named '{request.name}')")
-            
-            # Move all faces from current cluster to existing cluster
-            cursor.execute("""
-                UPDATE faces 
-                SET cluster_id = %s 
-                WHERE cluster_id = %s
-            """, (existing_cluster_id, cluster_id))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             
-            # Update face count in existing cluster
+            # Check if another cluster already has this name
             cursor.execute("""
-                UPDATE face_clusters 
-                SET face_count = (
-                    SELECT COUNT(*) FROM faces WHERE cluster_id = %s
-                ),
-                updated_at = NOW()
-                WHERE id = %s
-            """, (existing_cluster_id, existing_cluster_id))
-            
-            # Delete the now-empty cluster
-            cursor.execute("DELETE FROM face_clusters WHERE id = %s", (cluster_id,))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                "message": f"Clusters merged into '{request.name}'",
-                "merged_into": existing_cluster_id
-            }
-        else:
-            # No existing cluster with this name, just update the name
-            cursor.execute("""
-                UPDATE face_clusters
-                SET name = %s, updated_at = NOW()
-                WHERE id = %s
+                SELECT id, face_count, representative_face_id 
+                FROM face_clusters 
+                WHERE name = %s AND id != %s
             """, (request.name, cluster_id))
             
-            if cursor.rowcount == 0:
-                cursor.close()
-                conn.close()
-                raise HTTPException(status_code=404, detail="Person cluster not found")
+            existing_cluster = cursor.fetchone()
             
-            conn.commit()
-            cursor.close()
-            conn.close()
+            if existing_cluster:
+                # Merge clusters: move all faces from current cluster to existing cluster
+                existing_cluster_id = existing_cluster['id']
+                
+                print(f">> Merging cluster {cluster_id} into {existing_cluster_id} (both named '{request.name}')")
+                
+                # Move all faces from current cluster to existing cluster
+                cursor.execute("""
+                    UPDATE faces 
+                    SET cluster_id = %s 
+                    WHERE cluster_id = %s
+                """, (existing_cluster_id, cluster_id))
+                
+                # Update face count in existing cluster
+                cursor.execute("""
+                    UPDATE face_clusters 
+                    SET face_count = (
+                        SELECT COUNT(*) FROM faces WHERE cluster_id = %s
+                    ),
+                    updated_at = NOW()
+                    WHERE id = %s
+                """, (existing_cluster_id, existing_cluster_id))
+                
+                # Delete the now-empty cluster
+                cursor.execute("DELETE FROM face_clusters WHERE id = %s", (cluster_id,))
+                
+                conn.commit()
+                cursor.close()
+                
+                return {
+                    "message": f"Clusters merged into '{request.name}'",
+                    "merged_into": existing_cluster_id
+                }
+            else:
+                # No existing cluster with this name, just update the name
+                cursor.execute("""
+                    UPDATE face_clusters
+                    SET name = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (request.name, cluster_id))
+                
+                if cursor.rowcount == 0:
+                    cursor.close()
+                    raise HTTPException(status_code=404, detail="Person cluster not found")
+                
+                conn.commit()
+                cursor.close()
             
             return {"message": f"Person labeled as '{request.name}'"}
     except HTTPException:
@@ -820,19 +849,18 @@ async def label_person(cluster_id: str, request: LabelPersonRequest):
 async def get_person_images(cluster_id: str):
     """Get all images containing a specific person."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT DISTINCT i.id, i.file_path, i.created_at
-            FROM images i
-            JOIN faces f ON f.image_id = i.id
-            WHERE f.cluster_id = %s
-            ORDER BY i.created_at DESC
-        """, (cluster_id,))
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT DISTINCT i.id, i.file_path, i.created_at
+                FROM images i
+                JOIN faces f ON f.image_id = i.id
+                WHERE f.cluster_id = %s
+                ORDER BY i.created_at DESC
+            """, (cluster_id,))
+            rows = cursor.fetchall()
+            cursor.close()
         
         images = []
         for row in rows:
@@ -854,28 +882,26 @@ async def get_person_images(cluster_id: str):
 async def delete_person(cluster_id: str):
     """Delete a face cluster and permanently delete all its associated faces."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if cluster exists
-        cursor.execute("SELECT id FROM face_clusters WHERE id = %s", (cluster_id,))
-        if not cursor.fetchone():
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if cluster exists
+            cursor.execute("SELECT id FROM face_clusters WHERE id = %s", (cluster_id,))
+            if not cursor.fetchone():
+                cursor.close()
+                raise HTTPException(status_code=404, detail="Person not found")
+            
+            # PERMANENTLY delete all faces in this cluster (not just unassign)
+            cursor.execute("""
+                DELETE FROM faces 
+                WHERE cluster_id = %s
+            """, (cluster_id,))
+            
+            # Delete the cluster
+            cursor.execute("DELETE FROM face_clusters WHERE id = %s", (cluster_id,))
+            
+            conn.commit()
             cursor.close()
-            conn.close()
-            raise HTTPException(status_code=404, detail="Person not found")
-        
-        # PERMANENTLY delete all faces in this cluster (not just unassign)
-        cursor.execute("""
-            DELETE FROM faces 
-            WHERE cluster_id = %s
-        """, (cluster_id,))
-        
-        # Delete the cluster
-        cursor.execute("DELETE FROM face_clusters WHERE id = %s", (cluster_id,))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
         
         return {"message": "Person and all associated faces deleted permanently"}
     except HTTPException:
@@ -903,6 +929,13 @@ async def cluster_faces():
         raise HTTPException(status_code=500, detail=f"Clustering failed: {str(e)}")
 
 
+def _load_vlm_input(file_path: str, size: int) -> Image.Image:
+    """Decode an image for captioning; DCT-scaled decode for JPEGs, no-op for other formats."""
+    image = Image.open(file_path)
+    image.draft("RGB", (size, size))
+    return image.convert("RGB")
+
+
 @app.post("/reprocess-vlm")
 async def reprocess_vlm_descriptions():
     """Generate VLM descriptions for all images that don't have them."""
@@ -910,54 +943,90 @@ async def reprocess_vlm_descriptions():
         if not config.ENABLE_VLM:
             raise HTTPException(status_code=503, detail="VLM is disabled")
         
-        from vlm_service import get_vlm_service
         vlm_service = get_vlm_service()
         
         if not vlm_service.is_available():
             raise HTTPException(status_code=503, detail="VLM service not available")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, file_path 
-            FROM images 
-            WHERE vlm_processed = FALSE OR vlm_description IS NULL
-            ORDER BY created_at DESC
-        """)
-        images = cursor.fetchall()
-        
-        if not images:
-            return {"message": "All images already have VLM descriptions", "processed": 0}
-        
-        processed = 0
-        failed = 0
-        
-        for row in images:
-            image_id = row['id']
-            file_path = row['file_path']
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, file_path 
+                FROM images 
+                WHERE {VLM_UNPROCESSED_PREDICATE}
+                ORDER BY created_at DESC
+            """)
+            images = cursor.fetchall()
+            
+            if not images:
+                return {"message": "All images already have VLM descriptions", "processed": 0}
+            
+            processed = 0
+            failed = 0
+            total = len(images)
+            batch_start = time.time()
+            
+            # Decoder threads load the next chunk while the current one is on the GPU
+            prefetch = ThreadPoolExecutor(max_workers=4)
+            
+            def submit_chunk(start):
+                return [
+                    (row, prefetch.submit(_load_vlm_input, row['file_path'], vlm_service.input_size))
+                    for row in images[start:start + config.VLM_BATCH_SIZE]
+                ]
             
             try:
-                from PIL import Image
-                image = Image.open(file_path).convert("RGB")
-                description = vlm_service.generate_caption(image)
-                
-                if description:
-                    cursor.execute(
-                        "UPDATE images SET vlm_description = %s, vlm_processed = TRUE WHERE id = %s",
-                        (description, image_id)
-                    )
+                pending = submit_chunk(0)
+                for start in range(0, total, config.VLM_BATCH_SIZE):
+                    chunk = pending
+                    rows = [row for row, _ in chunk]
+                    pending = submit_chunk(start + config.VLM_BATCH_SIZE)
+                    
+                    # Collect the prefetched chunk, then caption it in one generate() call
+                    loaded = []
+                    for row, future in chunk:
+                        try:
+                            loaded.append((row['id'], future.result()))
+                        except Exception as e:
+                            reprocess_log.warning("Failed to process %s: %s", row['id'], e)
+                            failed += 1
+                    
+                    try:
+                        descriptions = vlm_service.generate_captions([image for _, image in loaded])
+                    except Exception as e:
+                        # Keep one bad image from failing the whole chunk
+                        reprocess_log.warning("Batch captioning failed (%s); captioning one at a time", e)
+                        descriptions = []
+                        for image_id, image in loaded:
+                            try:
+                                descriptions.append(vlm_service.generate_caption(image))
+                            except Exception as e:
+                                reprocess_log.warning("Failed to process %s: %s", image_id, e)
+                                descriptions.append(None)
+                    
+                    for (image_id, _), description in zip(loaded, descriptions):
+                        if description:
+                            cursor.execute(
+                                "UPDATE images SET vlm_description = %s, vlm_processed = TRUE WHERE id = %s",
+                                (description, image_id)
+                            )
+                            processed += 1
+                            reprocess_log.debug("Processed %s: %.80s", image_id, description)
+                        else:
+                            failed += 1
                     conn.commit()
-                    processed += 1
-                    print(f">> Processed {image_id}: {description[:80]}...")
-                else:
-                    failed += 1
-            except Exception as e:
-                print(f">> Failed to process {image_id}: {str(e)}")
-                failed += 1
-                continue
-        
-        cursor.close()
-        conn.close()
+                    
+                    idx = start + len(rows)
+                    if idx // config.PROGRESS_BATCH_SIZE > start // config.PROGRESS_BATCH_SIZE or idx == total:
+                        reprocess_log.info(
+                            "%d/%d done (%d failed), batch took %.1fs",
+                            idx, total, failed, time.time() - batch_start
+                        )
+                        batch_start = time.time()
+            finally:
+                # Always stop the decoder threads, dropping prefetches nobody will read
+                prefetch.shutdown(cancel_futures=True)
+            cursor.close()
         
         return {
             "message": "VLM reprocessing complete",
@@ -979,18 +1048,17 @@ async def get_image_details(image_id: str):
     Used for displaying image details in Deep Search modal.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, file_path, vlm_description, vlm_processed, created_at
-            FROM images
-            WHERE id = %s
-        """, (image_id,))
-        
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, file_path, vlm_description, vlm_processed, created_at
+                FROM images
+                WHERE id = %s
+            """, (image_id,))
+            
+            row = cursor.fetchone()
+            cursor.close()
         
         if not row:
             raise HTTPException(status_code=404, detail="Image not found")
@@ -0,0 +1,19 @@
+"""
+PyTorch performance settings shared by the VLM service and test scripts.
+Import this before anything else touches torch, so the allocator setting
+is in place before CUDA initializes.
+"""
+import os
+
+# Grow allocator segments in place instead of reallocating during generate()
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
+import torch
+
+# Let cuDNN benchmark conv algorithms for the vision encoder's fixed input size
+torch.backends.cudnn.benchmark = True
+
+# TF32 matmuls on Ampere+ (no effect on older GPUs or half-precision layers)
+torch.set_float32_matmul_precision("high")
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
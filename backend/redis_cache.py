@@ -2,7 +2,7 @@
 Redis cache service for storing image embeddings.
 Provides fast access to frequently used embeddings.
 """
-import redis
+import redis.asyncio as redis
 import numpy as np
 import pickle
 from typing import Optional
@@ -13,16 +13,18 @@ class RedisCache:
     """Redis cache for image embeddings."""
     
     def __init__(self):
-        """Initialize Redis connection."""
-        self.client = redis.Redis(
+        """Initialize pooled async Redis client (shared for the app lifetime)."""
+        self.pool = redis.ConnectionPool(
             host=config.REDIS_HOST,
             port=config.REDIS_PORT,
             db=0,
+            max_connections=config.REDIS_MAX_CONNECTIONS,
             decode_responses=False  # Store binary data
         )
+        self.client = redis.Redis(connection_pool=self.pool)
         print(f">> Redis connected: {config.REDIS_HOST}:{config.REDIS_PORT}")
     
-    def get_embedding(self, image_id: str) -> Optional[np.ndarray]:
+    async def get_embedding(self, image_id: str) -> Optional[np.ndarray]:
         """
         Get cached embedding for an image.
         
@@ -33,7 +35,7 @@ class RedisCache:
             numpy array of embedding or None if not cached
         """
         key = f"emb:{image_id}"
-        data = self.client.get(key)
+        data = await self.client.get(key)
         
         if data is None:
             return None
@@ -42,7 +44,7 @@ class RedisCache:
         embedding = pickle.loads(data)
         return embedding
     
-    def set_embedding(self, image_id: str, embedding: np.ndarray, ttl: int = None):
+    async def set_embedding(self, image_id: str, embedding: np.ndarray, ttl: int = None):
         """
         Cache an embedding for an image.
         
@@ -55,24 +57,38 @@ class RedisCache:
         data = pickle.dumps(embedding)
         
         if ttl:
-            self.client.setex(key, ttl, data)
+            await self.client.setex(key, ttl, data)
         else:
-            self.client.set(key, data)
+            await self.client.set(key, data)
     
-    def delete_embedding(self, image_id: str):
+    async def delete_embedding(self, image_id: str):
         """Delete cached embedding for an image."""
         key = f"emb:{image_id}"
-        self.client.delete(key)
+        await self.client.delete(key)
     
-    def clear_all(self):
+    async def delete_embeddings(self, image_ids: list):
+        """Delete cached embeddings for several images in one command."""
+        if image_ids:
+            await self.client.delete(*(f"emb:{image_id}" for image_id in image_ids))
+    
+    async def get_caption(self, content_hash: str) -> Optional[str]:
+        """Get the VLM caption stored for an image's content hash."""
+        data = await self.client.get(f"caption:{content_hash}")
+        return data.decode() if data is not None else None
+    
+    async def set_caption(self, content_hash: str, caption: str):
+        """Store a VLM caption under an image's content hash."""
+        await self.client.set(f"caption:{content_hash}", caption.encode())
+    
+    async def clear_all(self):
         """Clear all cached embeddings."""
-        self.client.flushdb()
+        await self.client.flushdb()
         print(">> Redis cache cleared")
     
-    def get_stats(self) -> dict:
+    async def get_stats(self) -> dict:
         """Get cache statistics."""
-        info = self.client.info('stats')
-        memory = self.client.info('memory')
+        info = await self.client.info('stats')
+        memory = await self.client.info('memory')
         
         hits = info.get('keyspace_hits', 0)
         misses = info.get('keyspace_misses', 0)
@@ -80,12 +96,16 @@ class RedisCache:
         hit_rate = round((hits / total) * 100, 2) if total > 0 else 0.0
         
         return {
-            'total_keys': self.client.dbsize(),
+            'total_keys': await self.client.dbsize(),
             'used_memory_mb': round(memory['used_memory'] / 1024 / 1024, 2),
             'hits': hits,
             'misses': misses,
             'hit_rate': hit_rate
         }
+    
+    async def close(self):
+        """Close the client and release pooled connections."""
+        await self.client.aclose()
 
 
 # Global singleton instance
@@ -4,15 +4,52 @@ Useful after changing CLIP model or fixing corrupted data.
 """
 from pathlib import Path
 from PIL import Image
+import numpy as np
+import asyncio
+import logging
 import sys
+import time
 
 import config
 from database import get_db_connection, get_qdrant_client
 from embedding_service import get_embedding_service
 from redis_cache import get_redis_cache
 
+log = logging.getLogger("reindex")
 
-def reindex_all_images():
+
+def flush_points(qdrant_client, ids: list, embeddings: list) -> int:
+    """
+    Upload buffered embeddings to Qdrant as one (N, D) float32 matrix.
+    
+    upload_collection() takes the numpy array directly, so vectors are not
+    boxed into Python float lists one point at a time.
+    
+    Returns:
+        Number of points that failed to upload
+    """
+    if not ids:
+        return 0
+    
+    try:
+        qdrant_client.upload_collection(
+            collection_name=config.QDRANT_COLLECTION,
+            vectors=np.ascontiguousarray(np.stack(embeddings), dtype=np.float32),
+            payload=[{"image_id": image_id} for image_id in ids],
+            ids=list(ids),
+            batch_size=len(ids),
+            wait=True
+        )
+        return 0
+    except Exception as e:
+        log.warning("Qdrant upload of %d points failed: %s", len(ids), e)
+        return len(ids)
+    finally:
+        ids.clear()
+        embeddings.clear()
+
+
+async def reindex_all_images():
     """Reindex all images in the database."""
     print(">> Starting reindex process...")
     
@@ -20,63 +57,75 @@ def reindex_all_images():
     embedding_service = get_embedding_service()
     qdrant_client = get_qdrant_client()
     redis_cache = get_redis_cache()
+    target = embedding_service.input_size
     
     # Get all images from database
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, file_path FROM images")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, file_path FROM images")
+        rows = cursor.fetchall()
+        cursor.close()
     
     total = len(rows)
     print(f">> Found {total} images to reindex")
     
     success_count = 0
     error_count = 0
+    batch_start = time.time()
+    pending_ids = []
+    pending_embeddings = []
     
     for idx, row in enumerate(rows, 1):
         image_id = row['id']
         file_path = Path(row['file_path'])
         
-        print(f"[{idx}/{total}] Processing {image_id}...", end=" ")
-        
         try:
             if not file_path.exists():
-                print("SKIP (file not found)")
+                log.debug("[%d/%d] SKIP %s (file not found)", idx, total, image_id)
                 error_count += 1
                 continue
             
-            # Load image
+            # Load image, letting libjpeg decode at a reduced scale for large JPEGs
             image = Image.open(file_path)
+            image.draft("RGB", (target, target))
+            image = image.convert("RGB")
             
             # Compute embedding
             embedding = embedding_service.encode_image(image)
             
-            # Update Qdrant
-            qdrant_client.upsert(
-                collection_name=config.QDRANT_COLLECTION,
-                points=[{
-                    "id": image_id,
-                    "vector": embedding.tolist(),
-                    "payload": {"image_id": image_id}
-                }]
-            )
+            # Queue for the next batched Qdrant upload
+            pending_ids.append(image_id)
+            pending_embeddings.append(embedding)
             
             # Update Redis cache
-            redis_cache.set_embedding(image_id, embedding)
+            await redis_cache.set_embedding(image_id, embedding)
             
-            print("OK")
+            log.debug("[%d/%d] OK %s", idx, total, image_id)
             success_count += 1
             
         except Exception as e:
-            print(f"ERROR: {str(e)}")
+            log.warning("[%d/%d] ERROR %s: %s", idx, total, image_id, e)
             error_count += 1
+        
+        finally:
+            if idx % config.PROGRESS_BATCH_SIZE == 0 or idx == total:
+                failed = flush_points(qdrant_client, pending_ids, pending_embeddings)
+                success_count -= failed
+                error_count += failed
+                log.info(
+                    "%d/%d done (%d errors), batch took %.1fs",
+                    idx, total, error_count, time.time() - batch_start
+                )
+                batch_start = time.time()
     
     print(f"\n>> Reindex complete!")
     print(f"   Success: {success_count}")
     print(f"   Errors: {error_count}")
+    
+    await redis_cache.close()
+    qdrant_client.close()
 
 
 if __name__ == "__main__":
-    reindex_all_images()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(reindex_all_images())
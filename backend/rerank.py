@@ -0,0 +1,107 @@
+"""
+Numba kernels for re-ranking cached embeddings against a query vector.
+Keeps the O(N*D) scoring loop out of the Python interpreter.
+"""
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _sift_down(heap_score, heap_idx, pos, size):
+    """Restore the min-heap property below pos."""
+    while True:
+        left = 2 * pos + 1
+        right = left + 1
+        smallest = pos
+        if left < size and heap_score[left] < heap_score[smallest]:
+            smallest = left
+        if right < size and heap_score[right] < heap_score[smallest]:
+            smallest = right
+        if smallest == pos:
+            return
+        heap_score[pos], heap_score[smallest] = heap_score[smallest], heap_score[pos]
+        heap_idx[pos], heap_idx[smallest] = heap_idx[smallest], heap_idx[pos]
+        pos = smallest
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def topk_cosine(X, q, k, out_idx, out_score):
+    """
+    Top-k cosine similarity of each row of X against q.
+
+    Args:
+        X: (N, D) embeddings (float16 or float32)
+        q: (D,) float32 query vector
+        k: Number of results to keep
+        out_idx: int64 buffer of length >= k, filled with row indices
+        out_score: float32 buffer of length >= k, filled with scores
+
+    Returns:
+        (out_idx, out_score) sorted by descending score
+    """
+    n, d = X.shape
+    k = min(k, n)
+
+    q_norm = np.float32(0.0)
+    for j in range(d):
+        q_norm += q[j] * q[j]
+    q_norm = np.sqrt(q_norm) + np.float32(1e-12)
+
+    scores = np.empty(n, dtype=np.float32)
+    for i in prange(n):
+        dot = np.float32(0.0)
+        x_norm = np.float32(0.0)
+        for j in range(d):
+            x = np.float32(X[i, j])
+            dot += x * q[j]
+            x_norm += x * x
+        scores[i] = dot / ((np.sqrt(x_norm) + np.float32(1e-12)) * q_norm)
+
+    # Min-heap of the k best scores seen so far
+    heap_score = np.empty(k, dtype=np.float32)
+    heap_idx = np.empty(k, dtype=np.int64)
+    for i in range(k):
+        heap_score[i] = scores[i]
+        heap_idx[i] = i
+    for pos in range(k // 2 - 1, -1, -1):
+        _sift_down(heap_score, heap_idx, pos, k)
+
+    for i in range(k, n):
+        if scores[i] > heap_score[0]:
+            heap_score[0] = scores[i]
+            heap_idx[0] = i
+            _sift_down(heap_score, heap_idx, 0, k)
+
+    # Pop the heap from smallest to largest, filling the output back to front
+    size = k
+    while size > 0:
+        size -= 1
+        out_score[size] = heap_score[0]
+        out_idx[size] = heap_idx[0]
+        heap_score[0] = heap_score[size]
+        heap_idx[0] = heap_idx[size]
+        _sift_down(heap_score, heap_idx, 0, size)
+
+    return out_idx[:k], out_score[:k]
+
+
+def rerank(embeddings: np.ndarray, query: np.ndarray, k: int):
+    """
+    Return (indices, scores) of the k embeddings most similar to the query.
+
+    Args:
+        embeddings: (N, D) matrix of cached embeddings
+        query: (D,) query embedding
+        k: Number of results
+    """
+    if len(embeddings) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    X = np.ascontiguousarray(embeddings)
+    if X.dtype != np.float16:
+        X = X.astype(np.float32, copy=False)
+    q = np.ascontiguousarray(query, dtype=np.float32).ravel()
+
+    out_idx = np.empty(k, dtype=np.int64)
+    out_score = np.empty(k, dtype=np.float32)
+    return topk_cosine(X, q, k, out_idx, out_score)
@@ -3,7 +3,7 @@ from uuid import UUID
 from pydantic import BaseModel
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 
 from database import get_db
 from models import User, FaceCluster, Face, Image
@@ -40,22 +40,26 @@ async def list_face_clusters(
     )
     clusters = result.scalars().all()
     
-    response = []
-    for cluster in clusters:
-        # Count images in cluster
-        face_result = await db.execute(
-            select(Face).where(Face.cluster_id == cluster.id)
-        )
-        face_count = len(face_result.scalars().all())
-        
-        response.append(FaceClusterResponse(
+    if not clusters:
+        return []
+    
+    # Count faces for all clusters in a single GROUP BY query
+    count_result = await db.execute(
+        select(Face.cluster_id, func.count())
+        .where(Face.cluster_id.in_([c.id for c in clusters]))
+        .group_by(Face.cluster_id)
+    )
+    face_counts = dict(count_result.all())
+    
+    return [
+        FaceClusterResponse(
             id=cluster.id,
             name=cluster.name,
             representative_face_path=cluster.representative_face_path,
-            image_count=face_count
-        ))
-    
-    return response
+            image_count=face_counts.get(cluster.id, 0)
+        )
+        for cluster in clusters
+    ]
 
 
 @router.get("/clusters/{cluster_id}/images", response_model=List[FaceImageResponse])
@@ -117,10 +121,9 @@ async def update_cluster_name(
     await db.refresh(cluster)
     
     # Get face count
-    face_result = await db.execute(
-        select(Face).where(Face.cluster_id == cluster.id)
-    )
-    face_count = len(face_result.scalars().all())
+    face_count = (await db.execute(
+        select(func.count()).select_from(Face).where(Face.cluster_id == cluster.id)
+    )).scalar_one()
     
     return FaceClusterResponse(
         id=cluster.id,
@@ -149,15 +152,15 @@ async def search_by_person(
     if not clusters:
         return {"results": [], "total": 0}
     
-    # Get all images from matching clusters
+    # Get all images from matching clusters (only the columns we return)
     cluster_ids = [c.id for c in clusters]
     result = await db.execute(
-        select(Image)
+        select(Image.id, Image.filename, Image.thumbnail_path)
         .join(Face, Face.image_id == Image.id)
         .where(Face.cluster_id.in_(cluster_ids))
         .distinct()
     )
-    images = result.scalars().all()
+    images = result.all()
     
     return {
         "results": [
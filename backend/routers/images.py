@@ -1,16 +1,20 @@
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Optional, Tuple
 from uuid import UUID
+import base64
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, delete, tuple_
 
 from database import get_db
 from models import User, Image
 from auth import get_current_user
 from services.storage import save_image, delete_image_files
-from workers.processor import process_image_task
+from config import TASK_QUEUE
+from services.query_cache import query_cache
+from workers.processor import process_image_batch
+from workers.queue import enqueue_image_processing
 
 router = APIRouter()
 
@@ -32,6 +36,25 @@ class ImageResponse(BaseModel):
 class ImageListResponse(BaseModel):
     images: List[ImageResponse]
     total: int
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(image: Image) -> str:
+    """Encode an image's (created_at, id) sort key as an opaque page cursor."""
+    raw = f"{image.created_at.isoformat()}|{image.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a page cursor back into (created_at, id)."""
+    try:
+        created_at, image_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(image_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
 
 
 @router.post("/upload", response_model=List[ImageResponse], status_code=status.HTTP_201_CREATED)
@@ -52,9 +75,6 @@ async def upload_images(
         # Save file and create DB record
         image = await save_image(file, current_user.id, db)
         uploaded_images.append(image)
-        
-        # Queue background processing
-        background_tasks.add_task(process_image_task, str(image.id))
     
     if not uploaded_images:
         raise HTTPException(
@@ -62,6 +82,13 @@ async def upload_images(
             detail="No valid images uploaded"
         )
     
+    # Hand processing to the arq worker, or run it in-process as one batch
+    image_ids = [str(image.id) for image in uploaded_images]
+    if TASK_QUEUE == "arq":
+        await enqueue_image_processing(image_ids)
+    else:
+        background_tasks.add_task(process_image_batch, image_ids)
+    
     return uploaded_images
 
 
@@ -70,26 +97,39 @@ async def list_images(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    """List all images owned by the current user."""
+    """
+    List all images owned by the current user.
+    
+    Pass the returned next_cursor to fetch the following page; keyset
+    pagination stays fast at any depth, unlike skip (OFFSET).
+    """
     # Get total count
     count_result = await db.execute(
-        select(Image).where(Image.owner_id == current_user.id)
+        select(func.count()).select_from(Image).where(Image.owner_id == current_user.id)
     )
-    total = len(count_result.scalars().all())
+    total = count_result.scalar_one()
     
-    # Get paginated results
-    result = await db.execute(
+    # Get paginated results, newest first; id breaks created_at ties
+    query = (
         select(Image)
         .where(Image.owner_id == current_user.id)
-        .order_by(Image.created_at.desc())
-        .offset(skip)
+        .order_by(Image.created_at.desc(), Image.id.desc())
         .limit(limit)
     )
+    if cursor:
+        query = query.where(tuple_(Image.created_at, Image.id) < tuple_(*decode_cursor(cursor)))
+    else:
+        query = query.offset(skip)
+    
+    result = await db.execute(query)
     images = result.scalars().all()
     
-    return ImageListResponse(images=images, total=total)
+    next_cursor = encode_cursor(images[-1]) if len(images) == limit else None
+    
+    return ImageListResponse(images=images, total=total, next_cursor=next_cursor)
 
 
 @router.get("/{image_id}", response_model=ImageResponse)
@@ -121,7 +161,7 @@ async def delete_image(
 ):
     """Delete an image and all related data (faces, embeddings)."""
     from models import Face
-    from services.qdrant import delete_image_embedding, delete_face_embedding
+    from services.qdrant import delete_image_embedding, delete_face_embeddings
     
     result = await db.execute(
         select(Image).where(Image.id == image_id, Image.owner_id == current_user.id)
@@ -136,17 +176,17 @@ async def delete_image(
     
     # Delete related faces first (to satisfy foreign key constraint)
     faces_result = await db.execute(
-        select(Face).where(Face.image_id == image_id)
+        select(Face.id).where(Face.image_id == image_id)
     )
-    faces = faces_result.scalars().all()
+    face_ids = [str(face_id) for face_id in faces_result.scalars().all()]
     
-    for face in faces:
-        # Delete face embedding from Qdrant
-        try:
-            await delete_face_embedding(str(current_user.id), str(face.id))
-        except Exception:
-            pass  # Ignore Qdrant errors
-        await db.delete(face)
+    # Delete all face embeddings from Qdrant in one call
+    try:
+        await delete_face_embeddings(str(current_user.id), face_ids)
+    except Exception:
+        pass  # Ignore Qdrant errors
+    
+    await db.execute(delete(Face).where(Face.image_id == image_id))
     
     # Delete image embedding from Qdrant
     try:
@@ -160,6 +200,8 @@ async def delete_image(
     # Delete image from database
     await db.delete(image)
     await db.commit()
+    
+    await query_cache.invalidate_user(str(current_user.id))
 
 
 @router.get("/{image_id}/status")
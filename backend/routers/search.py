@@ -1,3 +1,4 @@
+import threading
 from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel
@@ -5,11 +6,17 @@ from fastapi import APIRouter, Depends, Query
 
 from models import User
 from auth import get_current_user
-from services.search import normal_search, deep_search
+from services.search import normal_search, deep_search, warm_text_embedding_cache
 
 router = APIRouter()
 
 
+@router.on_event("startup")
+async def warm_search_vocabulary():
+    """Pre-encode search vocabulary in the background once the app including this router starts."""
+    threading.Thread(target=warm_text_embedding_cache, name="warm-text-embeddings", daemon=True).start()
+
+
 class SearchResult(BaseModel):
     id: UUID
     filename: str
@@ -43,35 +43,42 @@ async def share_image(
     db: AsyncSession = Depends(get_db)
 ):
     """Share an image with another user."""
-    # Verify image ownership
+    # Ownership, target user and duplicate checks in a single round-trip
+    target_user_id = (
+        select(User.id)
+        .where(User.username == request.shared_with_username)
+        .scalar_subquery()
+    )
     result = await db.execute(
-        select(Image).where(Image.id == request.image_id, Image.owner_id == current_user.id)
+        select(
+            select(Image.id)
+            .where(Image.id == request.image_id, Image.owner_id == current_user.id)
+            .exists()
+            .label("image_owned"),
+            target_user_id.label("target_user_id"),
+            select(Share.id)
+            .where(
+                and_(
+                    Share.image_id == request.image_id,
+                    Share.shared_with_id == target_user_id
+                )
+            )
+            .exists()
+            .label("already_shared")
+        )
     )
-    image = result.scalar_one_or_none()
-    if not image:
+    checks = result.one()
+    
+    if not checks.image_owned:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    # Find target user
-    result = await db.execute(
-        select(User).where(User.username == request.shared_with_username)
-    )
-    target_user = result.scalar_one_or_none()
-    if not target_user:
+    if checks.target_user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if target_user.id == current_user.id:
+    if checks.target_user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot share with yourself")
     
-    # Check if already shared
-    result = await db.execute(
-        select(Share).where(
-            and_(
-                Share.image_id == request.image_id,
-                Share.shared_with_id == target_user.id
-            )
-        )
-    )
-    if result.scalar_one_or_none():
+    if checks.already_shared:
         raise HTTPException(status_code=400, detail="Already shared with this user")
     
     # Create share
@@ -79,7 +86,7 @@ async def share_image(
     share = Share(
         image_id=request.image_id,
         owner_id=current_user.id,
-        shared_with_id=target_user.id,
+        shared_with_id=checks.target_user_id,
         permission=permission
     )
     db.add(share)
@@ -89,7 +96,7 @@ async def share_image(
     return ShareResponse(
         id=share.id,
         image_id=share.image_id,
-        shared_with_username=target_user.username,
+        shared_with_username=request.shared_with_username,
         permission=request.permission,
         created_at=share.created_at
     )
@@ -119,22 +126,28 @@ async def get_shares_by_me(
     db: AsyncSession = Depends(get_db)
 ):
     """Get all shares I've created."""
+    # Plain columns only: rows carry no ORM objects that could lazy-load per row
     result = await db.execute(
-        select(Share, User.username)
+        select(
+            Share.id,
+            Share.image_id,
+            Share.permission,
+            Share.created_at,
+            User.username
+        )
         .join(User, Share.shared_with_id == User.id)
         .where(Share.owner_id == current_user.id)
     )
-    shares = result.all()
     
     return [
         ShareResponse(
-            id=share.id,
-            image_id=share.image_id,
-            shared_with_username=username,
-            permission=share.permission.value,
-            created_at=share.created_at
+            id=row.id,
+            image_id=row.image_id,
+            shared_with_username=row.username,
+            permission=row.permission.value,
+            created_at=row.created_at
         )
-        for share, username in shares
+        for row in result.all()
     ]
 
 
@@ -145,21 +158,27 @@ async def get_shares_with_me(
 ):
     """Get all images shared with me."""
     result = await db.execute(
-        select(Share, Image, User.username)
+        select(
+            Image.id,
+            Image.filename,
+            Image.thumbnail_path,
+            User.username,
+            Share.permission,
+            Share.created_at
+        )
         .join(Image, Share.image_id == Image.id)
         .join(User, Share.owner_id == User.id)
         .where(Share.shared_with_id == current_user.id)
     )
-    shares = result.all()
     
     return [
         SharedImageResponse(
-            id=image.id,
-            filename=image.filename,
-            thumbnail_path=image.thumbnail_path,
-            owner_username=username,
-            permission=share.permission.value,
-            shared_at=share.created_at
+            id=row.id,
+            filename=row.filename,
+            thumbnail_path=row.thumbnail_path,
+            owner_username=row.username,
+            permission=row.permission.value,
+            shared_at=row.created_at
         )
-        for share, image, username in shares
+        for row in result.all()
     ]
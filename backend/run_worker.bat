@@ -0,0 +1,5 @@
+@echo off
+echo Starting Media Search Worker...
+call venv\Scripts\activate.bat
+set PYTHONUNBUFFERED=1
+arq workers.processor.WorkerSettings
@@ -1,8 +1,9 @@
 """
 Search helper utilities for spell checking and suggestions.
 """
-from spellchecker import SpellChecker
-from typing import List, Optional
+from importlib.resources import files
+from symspellpy import SymSpell, Verbosity
+from typing import Dict, List, Optional
 
 
 class SearchHelper:
@@ -10,7 +11,13 @@ class SearchHelper:
     
     def __init__(self):
         """Initialize spell checker."""
-        self.spell = SpellChecker()
+        # SymSpell precomputes deletes, so lookups avoid per-word edit-distance search
+        self.sym = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+        self.sym.load_dictionary(
+            str(files("symspellpy") / "frequency_dictionary_en_82_765.txt"),
+            term_index=0,
+            count_index=1
+        )
         
         # Common search terms for suggestions
         self.common_terms = [
@@ -23,6 +30,14 @@ class SearchHelper:
             "food", "animal", "dog", "cat", "bird",
             "flower", "garden", "park", "river", "lake"
         ]
+        
+        # Substring -> indices of common terms containing it, so matching a
+        # query word is one dict lookup instead of a scan over every term
+        self._substring_to_terms: Dict[str, List[int]] = {}
+        for idx, term in enumerate(self.common_terms):
+            substrings = {term[i:j] for i in range(len(term)) for j in range(i + 1, len(term) + 1)}
+            for substring in substrings:
+                self._substring_to_terms.setdefault(substring, []).append(idx)
     
     def correct_spelling(self, query: str) -> tuple[str, bool]:
         """
@@ -34,22 +49,15 @@ class SearchHelper:
         Returns:
             (corrected_query, was_corrected)
         """
-        words = query.lower().split()
-        corrected_words = []
-        was_corrected = False
+        query = " ".join(query.lower().split())
+        if not query:
+            return query, False
         
-        for word in words:
-            # Get correction
-            corrected = self.spell.correction(word)
-            
-            if corrected and corrected != word:
-                corrected_words.append(corrected)
-                was_corrected = True
-            else:
-                corrected_words.append(word)
+        # One lookup for the whole phrase instead of one per word
+        suggestions = self.sym.lookup_compound(query, max_edit_distance=2, ignore_non_words=True)
         
-        corrected_query = " ".join(corrected_words)
-        return corrected_query, was_corrected
+        corrected_query = suggestions[0].term if suggestions else query
+        return corrected_query, corrected_query != query
     
     def get_suggestions(self, query: str, max_suggestions: int = 3) -> List[str]:
         """
@@ -63,14 +71,19 @@ class SearchHelper:
             List of suggested search terms
         """
         query_lower = query.lower()
-        suggestions = []
         
-        # Find similar terms from common terms
-        for term in self.common_terms:
-            if term not in query_lower and len(suggestions) < max_suggestions:
-                # Simple similarity check
-                if any(word in term for word in query_lower.split()):
-                    suggestions.append(term)
+        # Common terms containing any query word, in common_terms order
+        matches = set()
+        for word in query_lower.split():
+            matches.update(self._substring_to_terms.get(word, ()))
+        
+        suggestions = []
+        for idx in sorted(matches):
+            term = self.common_terms[idx]
+            if term not in query_lower:
+                suggestions.append(term)
+                if len(suggestions) >= max_suggestions:
+                    break
         
         # If no similar terms, return popular terms
         if not suggestions:
@@ -91,14 +104,10 @@ class SearchHelper:
         words = query.lower().split()
         
         for word in words:
-            # Check if word is misspelled
-            if word not in self.spell:
-                # Get best candidate
-                candidates = self.spell.candidates(word)
-                if candidates:
-                    best_match = list(candidates)[0]
-                    if best_match != word:
-                        return query.replace(word, best_match)
+            # Closest dictionary term; an exact hit at distance 0 means the word is known
+            candidates = self.sym.lookup(word, Verbosity.TOP, max_edit_distance=2)
+            if candidates and candidates[0].distance > 0:
+                return query.replace(word, candidates[0].term)
         
         return None
 
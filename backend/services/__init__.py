@@ -1,7 +1,7 @@
 from .storage import save_image, delete_image_files
-from .embeddings import get_siglip_model, encode_image, encode_text
-from .qdrant import get_qdrant_client, upsert_image_embedding, search_images
-from .search import normal_search, deep_search
+from .embeddings import get_siglip_model, encode_image, encode_text, encode_images, encode_texts
+from .qdrant import get_qdrant_client, upsert_image_embedding, upsert_image_embeddings_batch, search_images, search_images_multi
+from .search import normal_search, deep_search, warm_text_embedding_cache
 
 __all__ = [
     "save_image",
@@ -9,9 +9,14 @@ __all__ = [
     "get_siglip_model",
     "encode_image",
     "encode_text",
+    "encode_images",
+    "encode_texts",
     "get_qdrant_client",
     "upsert_image_embedding",
+    "upsert_image_embeddings_batch",
     "search_images",
+    "search_images_multi",
     "normal_search",
-    "deep_search"
+    "deep_search",
+    "warm_text_embedding_cache"
 ]
@@ -1,15 +1,41 @@
-from typing import Optional
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, List, Tuple, Dict, Union
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from transformers import AutoProcessor, AutoModel
 import numpy as np
+from scipy.special import expit
 
-from config import SIGLIP_MODEL, DEVICE, SIGLIP_EMBEDDING_DIM
+from config import (
+    SIGLIP_MODEL, DEVICE, SIGLIP_EMBEDDING_DIM, TORCH_COMPILE, TEXT_EMBEDDING_CACHE_SIZE,
+    TEXT_EMBEDDING_CACHE_PATH, TEXT_EMBEDDING_CACHE_FLUSH_EVERY
+)
+
+# Optional SIMD dot product kernels; single-pair dots skip NumPy's BLAS dispatch
+try:
+    from simsimd import dot as _simd_dot
+except ImportError:
+    _simd_dot = None
 
 # Global model cache
 _model = None
 _processor = None
 _actual_device = None
+_model_lock = threading.Lock()
+_model_dtype = torch.float32
+
+# text -> embedding LRU; encode_texts runs in worker threads, hence the lock
+_text_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_text_cache_lock = threading.Lock()
+# Texts encoded since the cache was last saved to disk
+_text_cache_unsaved = 0
+_text_cache_save_lock = threading.Lock()
+# Whether the cache saved by a previous run has been read back yet
+_text_cache_loaded = False
 
 
 def get_device():
@@ -34,87 +60,274 @@ def get_device():
 
 def get_siglip_model():
     """Get or initialize the SigLIP model (singleton)."""
-    global _model, _processor
-    
-    if _model is None:
-        device = get_device()
-        print(f"🔄 Loading SigLIP model: {SIGLIP_MODEL}")
-        try:
-            _processor = AutoProcessor.from_pretrained(SIGLIP_MODEL)
-            _model = AutoModel.from_pretrained(SIGLIP_MODEL)
-            _model.to(device)
-            _model.eval()
-            print(f"✅ SigLIP model loaded on {device}")
-        except Exception as e:
-            print(f"❌ Failed to load SigLIP model: {e}")
-            raise
+    global _model, _processor, _model_dtype
+    
+    if _model is not None:
+        return _model, _processor
+    
+    # The startup warmup thread and request threads may race to load the model
+    with _model_lock:
+        if _model is None:
+            device = get_device()
+            # bf16 halves weight/activation memory on GPU; CPU stays fp32
+            _model_dtype = torch.bfloat16 if device == "cuda" else torch.float32
+            print(f"🔄 Loading SigLIP model: {SIGLIP_MODEL}")
+            try:
+                processor = AutoProcessor.from_pretrained(SIGLIP_MODEL)
+                model = AutoModel.from_pretrained(SIGLIP_MODEL, torch_dtype=_model_dtype)
+                model.to(device, dtype=_model_dtype)
+                model.eval()
+                print(f"✅ SigLIP model loaded on {device} ({_model_dtype})")
+                
+                if device == "cuda":
+                    _optimize_for_cuda(model, processor)
+            except Exception as e:
+                print(f"❌ Failed to load SigLIP model: {e}")
+                raise
+            
+            # Publish only once fully set up, so lock-free readers never see a half-loaded model
+            _processor = processor
+            _model = model
     
     return _model, _processor
 
 
-def encode_image(image: Image.Image) -> np.ndarray:
+def _encode_batch(encode_fn, items: list) -> np.ndarray:
     """
-    Encode an image to a SigLIP embedding vector.
+    Run encode_fn on items, halving the batch on CUDA OOM.
     
-    Args:
-        image: PIL Image
-        
-    Returns:
-        768-dimensional embedding vector
+    The CUDA cache is only cleared after an OOM, not on every call, since
+    empty_cache() forces a device sync.
+    """
+    try:
+        return encode_fn(items)
+    except torch.cuda.OutOfMemoryError:
+        torch.cuda.empty_cache()
+        if len(items) == 1:
+            raise
+        mid = len(items) // 2
+        return np.concatenate([
+            _encode_batch(encode_fn, items[:mid]),
+            _encode_batch(encode_fn, items[mid:])
+        ])
+
+
+def _to_device(tensor: torch.Tensor, device: str, dtype: Optional[torch.dtype] = None) -> torch.Tensor:
+    """
+    Move a host tensor to the device. On CUDA the tensor is pinned first so
+    the copy is asynchronous and the forward pass can be queued right behind it.
     """
+    if device == "cuda":
+        return tensor.pin_memory().to(device, dtype=dtype, non_blocking=True)
+    return tensor.to(device, dtype=dtype)
+
+
+def _image_features(images: List[Image.Image]) -> np.ndarray:
     model, processor = get_siglip_model()
     device = get_device()
     
-    # Preprocess image
-    inputs = processor(images=image, return_tensors="pt")
-    inputs = {k: v.to(device) for k, v in inputs.items()}
+    # One preprocessing call and one forward pass for the whole batch; the
+    # image processor is called directly to skip the combined processor's dispatch
+    inputs = processor.image_processor(images=images, return_tensors="pt")
+    inputs["pixel_values"] = _to_device(inputs["pixel_values"], device, _model_dtype)
     
-    # Generate embedding
-    with torch.no_grad():
+    with torch.inference_mode():
         outputs = model.get_image_features(**inputs)
-        embedding = outputs.cpu().numpy().flatten()
+        # Upcast before normalizing to avoid bf16 reduction error
+        embeddings = F.normalize(outputs.float(), dim=-1)
+        return embeddings.cpu().numpy()
+
+
+@lru_cache(maxsize=4096)
+def _tokenize(texts: Tuple[str, ...]) -> Dict[str, torch.Tensor]:
+    """
+    Tokenize a batch of texts, cached on CPU so repeat queries skip the tokenizer.
     
-    # Clear GPU memory to prevent OOM on low VRAM GPUs
-    if device == "cuda":
-        del inputs, outputs
-        torch.cuda.empty_cache()
+    SigLIP pools the last token and was trained on max_length padding, so every
+    text is padded to the same fixed length; padding to the longest text in the
+    batch would give short terms a different embedding in a batch than alone.
+    """
+    _, processor = get_siglip_model()
+    return dict(processor(text=list(texts), return_tensors="pt", padding="max_length", truncation=True))
+
+
+def _text_features(texts: List[str]) -> np.ndarray:
+    model, _ = get_siglip_model()
+    device = get_device()
     
-    # Normalize
-    embedding = embedding / np.linalg.norm(embedding)
+    inputs = {k: _to_device(v, device) for k, v in _tokenize(tuple(texts)).items()}
     
-    return embedding
+    with torch.inference_mode():
+        outputs = model.get_text_features(**inputs)
+        embeddings = F.normalize(outputs.float(), dim=-1)
+        return embeddings.cpu().numpy()
 
 
-def encode_text(text: str) -> np.ndarray:
+def _optimize_for_cuda(model, processor):
+    """Enable TF32 matmuls, optionally compile the encoders, and prime them with a warmup pass."""
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.set_float32_matmul_precision("high")
+    
+    # get_*_features call the towers directly, so compile those submodules
+    if TORCH_COMPILE and hasattr(torch, "compile"):
+        model.vision_model = torch.compile(model.vision_model, mode="reduce-overhead", fullgraph=False)
+        model.text_model = torch.compile(model.text_model, mode="reduce-overhead", fullgraph=False)
+        print("✅ SigLIP encoders compiled with torch.compile")
+    
+    try:
+        size = processor.image_processor.size
+        height, width = size.get("height", 384), size.get("width", 384)
+        with torch.inference_mode():
+            model.get_image_features(
+                pixel_values=torch.zeros(1, 3, height, width, dtype=_model_dtype, device="cuda")
+            )
+            text_inputs = processor(text=["warmup"], return_tensors="pt", padding="max_length").to("cuda")
+            model.get_text_features(**text_inputs)
+    except Exception as e:
+        print(f"⚠️ SigLIP warmup failed: {e}")
+
+
+def encode_images(images: List[Image.Image]) -> np.ndarray:
     """
-    Encode text to a SigLIP embedding vector.
+    Encode a batch of images to SigLIP embedding vectors.
     
     Args:
-        text: Query string
+        images: List of PIL Images
         
     Returns:
-        768-dimensional embedding vector
+        (N, 768) array of normalized embeddings
     """
-    model, processor = get_siglip_model()
-    device = get_device()
+    if not images:
+        return np.empty((0, SIGLIP_EMBEDDING_DIM), dtype=np.float32)
+    return _encode_batch(_image_features, list(images))
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """
+    Encode a batch of texts to SigLIP embedding vectors.
     
-    # Preprocess text
-    inputs = processor(text=[text], return_tensors="pt", padding=True)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
+    Args:
+        texts: List of query strings
+        
+    Returns:
+        (N, 768) array of normalized embeddings
+    """
+    global _text_cache_unsaved
+    if not texts:
+        return np.empty((0, SIGLIP_EMBEDDING_DIM), dtype=np.float32)
     
-    # Generate embedding
-    with torch.no_grad():
-        outputs = model.get_text_features(**inputs)
-        embedding = outputs.cpu().numpy().flatten()
+    if not _text_cache_loaded:
+        _load_saved_text_cache()
+    
+    with _text_cache_lock:
+        cached = [_text_cache.get(text) for text in texts]
+        for text, embedding in zip(texts, cached):
+            if embedding is not None:
+                _text_cache.move_to_end(text)
+    
+    # Only texts not seen before go through the text tower, in one batch
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, cached) if embedding is None))
+    if missing:
+        encoded = dict(zip(missing, _encode_batch(_text_features, missing)))
+        with _text_cache_lock:
+            for text, embedding in encoded.items():
+                embedding.flags.writeable = False  # shared between callers
+                _text_cache[text] = embedding
+            while len(_text_cache) > TEXT_EMBEDDING_CACHE_SIZE:
+                _text_cache.popitem(last=False)
+            _text_cache_unsaved += len(encoded)
+            flush = _text_cache_unsaved >= TEXT_EMBEDDING_CACHE_FLUSH_EVERY
+        if flush:
+            save_text_embedding_cache()
+        cached = [encoded[text] if embedding is None else embedding for text, embedding in zip(texts, cached)]
+    
+    return np.stack(cached)
+
+
+def save_text_embedding_cache(path=TEXT_EMBEDDING_CACHE_PATH) -> None:
+    """Write the text embedding cache to an .npz file (atomically replaced)."""
+    global _text_cache_unsaved
+    with _text_cache_lock:
+        texts = list(_text_cache)
+        embeddings = np.stack(list(_text_cache.values())) if texts else None
+        _text_cache_unsaved = 0
+    if not texts:
+        return
+    
+    with _text_cache_save_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp_path, model=np.array(SIGLIP_MODEL), texts=np.array(texts), embeddings=embeddings)
+        os.replace(tmp_path, path)
+
+
+def _load_saved_text_cache() -> None:
+    """Read the previous run's cache once per process, before anything is encoded or saved."""
+    global _text_cache_loaded
+    with _text_cache_save_lock:
+        if not _text_cache_loaded:
+            count = load_text_embedding_cache()
+            if count:
+                print(f"✅ Loaded {count} cached text embeddings from {TEXT_EMBEDDING_CACHE_PATH}")
+            _text_cache_loaded = True
+
+
+def load_text_embedding_cache(path=TEXT_EMBEDDING_CACHE_PATH) -> int:
+    """
+    Fill the text embedding cache from a file written by save_text_embedding_cache.
+    Files from a different SigLIP model are ignored. Returns the number of texts loaded.
+    """
+    try:
+        with np.load(path) as data:
+            if str(data["model"]) != SIGLIP_MODEL:
+                return 0
+            texts = data["texts"].tolist()
+            embeddings = data["embeddings"]
+    except (OSError, KeyError, ValueError):
+        return 0
+    
+    embeddings.flags.writeable = False  # rows are shared between callers
+    with _text_cache_lock:
+        # Entries already encoded in this process are newer, so keep them most recent
+        for text, embedding in zip(reversed(texts), embeddings[::-1]):
+            if text not in _text_cache:
+                _text_cache[text] = embedding
+                _text_cache.move_to_end(text, last=False)
+        while len(_text_cache) > TEXT_EMBEDDING_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    return len(texts)
+
+
+def encode_image(image: Image.Image) -> np.ndarray:
+    """
+    Encode an image to a SigLIP embedding vector.
     
-    # Normalize
-    embedding = embedding / np.linalg.norm(embedding)
+    Args:
+        image: PIL Image
+        
+    Returns:
+        768-dimensional embedding vector
+    """
+    return encode_images([image])[0]
+
+
+def encode_text(text: str) -> np.ndarray:
+    """
+    Encode text to a SigLIP embedding vector.
     
-    return embedding
+    Args:
+        text: Query string
+        
+    Returns:
+        768-dimensional embedding vector
+    """
+    return encode_texts([text])[0]
 
 
 def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
-    """Compute cosine similarity between two embeddings."""
+    """Compute cosine similarity between two embeddings (both already L2-normalized)."""
+    if _simd_dot is not None and embedding1.dtype == embedding2.dtype == np.float32:
+        return float(_simd_dot(embedding1, embedding2))
     return float(np.dot(embedding1, embedding2))
 
 
@@ -144,3 +357,13 @@ def calibrate_siglip_score(raw_similarity: float, temperature: float = 25.0) ->
     # Scale by temperature and apply sigmoid
     scaled = raw_similarity * temperature
     return sigmoid(scaled)
+
+
+def calibrate_siglip_scores(raw_similarities: np.ndarray, temperature: Union[float, np.ndarray] = 25.0) -> np.ndarray:
+    """
+    calibrate_siglip_score over an array of cosine similarities at once.
+    temperature broadcasts too, so one similarity can be swept over many temperatures.
+    """
+    # expit is one overflow-safe sigmoid ufunc, replacing the clip/exp/add/divide chain
+    scaled = np.multiply(raw_similarities, temperature, dtype=np.float64)
+    return expit(scaled)
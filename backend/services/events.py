@@ -3,9 +3,20 @@ Event bus for publishing status updates via Server-Sent Events (SSE).
 """
 import asyncio
 from typing import Dict, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from collections import defaultdict
 
+import orjson
+import redis.asyncio as redis
+
+from config import REDIS_HOST, REDIS_PORT, TASK_QUEUE
+
+# Max buffered events per subscriber; the oldest is dropped when full
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Redis pub/sub channel carrying events from worker processes to the API
+EVENTS_CHANNEL = "media_search:events"
+
 
 @dataclass
 class StatusEvent:
@@ -19,15 +30,39 @@ class EventBus:
     """
     Simple in-memory event bus for SSE.
     Supports multiple subscribers per user.
+    
+    When processing runs in a separate worker process, events are relayed
+    through Redis pub/sub and fanned out locally by the API process.
     """
     
-    def __init__(self):
+    def __init__(self, relay: bool = False):
         # user_id -> set of asyncio.Queue
         self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._relay = relay
+        self._redis = None
+        self._listener = None
+    
+    def _get_redis(self):
+        if self._redis is None:
+            self._redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        return self._redis
+    
+    async def _listen(self):
+        """Forward events published by worker processes to local subscribers."""
+        pubsub = self._get_redis().pubsub()
+        await pubsub.subscribe(EVENTS_CHANNEL)
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            data = orjson.loads(message["data"])
+            self._deliver(data.pop("user_id"), StatusEvent(**data))
     
     def subscribe(self, user_id: str) -> asyncio.Queue:
         """Subscribe to events for a user. Returns a queue to receive events."""
-        queue = asyncio.Queue()
+        if self._relay and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+        
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
         self._subscribers[user_id].add(queue)
         return queue
     
@@ -40,12 +75,34 @@ class EventBus:
     
     async def publish(self, user_id: str, event: StatusEvent):
         """Publish an event to all subscribers for a user."""
-        if user_id in self._subscribers:
-            for queue in self._subscribers[user_id]:
+        if self._relay:
+            await self._get_redis().publish(
+                EVENTS_CHANNEL,
+                orjson.dumps({"user_id": user_id, **asdict(event)})
+            )
+        else:
+            self._deliver(user_id, event)
+    
+    def _deliver(self, user_id: str, event: StatusEvent):
+        """
+        Hand an event to this process's subscribers for a user.
+        
+        Never waits on a subscriber: a stalled SSE consumer loses its oldest
+        event instead of blocking delivery to the others.
+        """
+        # Snapshot so concurrent (un)subscribes can't mutate the set mid-iteration
+        queues = tuple(self._subscribers.get(user_id, ()))
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
                 try:
-                    await queue.put(event)
-                except Exception:
-                    pass  # Ignore errors on individual queues
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+                queue.put_nowait(event)
+            except Exception:
+                pass  # Ignore errors on individual queues
     
     def has_subscribers(self, user_id: str) -> bool:
         """Check if a user has any active subscribers."""
@@ -53,4 +110,4 @@ class EventBus:
 
 
 # Global event bus instance
-event_bus = EventBus()
+event_bus = EventBus(relay=TASK_QUEUE == "arq")
@@ -1,11 +1,16 @@
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
 from services.vocabulary import (
     normalize_object, 
     get_object_hierarchy,
     get_action_similarity,
-    OBJECT_SYNONYMS
+    get_object_category
 )
 
+# Image payload fields read by compute_match_score(s_batch)
+SCORING_FIELDS = ["objects", "action", "time", "scene", "weather", "emotion"]
+
 
 def compute_match_score(
     query_attrs: Dict,
@@ -82,6 +87,108 @@ def compute_match_score(
     return total_score / total_weight
 
 
+def _hashable(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _score_column(
+    metadata_batch: List[Dict],
+    field: str,
+    score_fn: Callable[[Any], float],
+    by_value: Dict[Any, float]
+) -> np.ndarray:
+    """
+    Score one metadata field for every candidate.
+    
+    score_fn runs once per distinct value; candidates sharing a value
+    (e.g. time="night") reuse the score.
+    """
+    scores = np.empty(len(metadata_batch), dtype=np.float64)
+    for row, metadata in enumerate(metadata_batch):
+        value = metadata.get(field)
+        key = _hashable(value)
+        score = by_value.get(key)
+        if score is None:
+            score = by_value[key] = score_fn(value)
+        scores[row] = score
+    return scores
+
+
+def compute_match_scores_batch(
+    query_attrs: Dict,
+    metadata_batch: List[Dict],
+    weights: Optional[Dict[str, float]] = None,
+    score_cache: Optional[Dict[tuple, Dict[Any, float]]] = None
+) -> np.ndarray:
+    """
+    compute_match_score for a whole candidate list at once.
+    
+    Each field is scored as a column (once per distinct image value) and the
+    weighted sum is done with NumPy over all candidates.
+    
+    Pass the same score_cache dict to repeated calls (e.g. relaxation levels)
+    to reuse per-value field scores for query attributes that didn't change.
+    
+    Returns array of scores between 0 and 1, aligned with metadata_batch.
+    """
+    if weights is None:
+        weights = {
+            "objects": 0.3,
+            "action": 0.3,
+            "time": 0.2,
+            "scene": 0.1,
+            "weather": 0.05,
+            "emotion": 0.05
+        }
+    
+    field_scorers: Dict[str, Callable[[Any], float]] = {}
+    if query_attrs.get("objects"):
+        field_scorers["objects"] = lambda v: match_objects(query_attrs["objects"], v or [])
+    if query_attrs.get("action"):
+        field_scorers["action"] = lambda v: get_action_similarity(query_attrs["action"], v)
+    if query_attrs.get("time"):
+        field_scorers["time"] = lambda v: match_time(query_attrs["time"], v)
+    for field in ("scene", "weather", "emotion"):
+        if query_attrs.get(field):
+            field_scorers[field] = lambda v, q=query_attrs[field]: match_exact_or_zero(q, v)
+    
+    if score_cache is None:
+        score_cache = {}
+    
+    total_score = np.zeros(len(metadata_batch), dtype=np.float64)
+    total_weight = 0.0
+    for field, score_fn in field_scorers.items():
+        by_value = score_cache.setdefault((field, _hashable(query_attrs[field])), {})
+        total_score += weights[field] * _score_column(metadata_batch, field, score_fn, by_value)
+        total_weight += weights[field]
+    
+    if total_weight == 0:
+        return total_score
+    
+    return total_score / total_weight
+
+
+_BEST_HIERARCHY_SCORE = 0.9
+
+
+@lru_cache(maxsize=4096)
+def _hierarchy_score(q_obj: str, i_obj: str) -> float:
+    """Hierarchy relaxation score for one normalized (query, image) object pair."""
+    q_hierarchy = get_object_hierarchy(q_obj)
+    i_hierarchy = get_object_hierarchy(i_obj)
+    
+    # Query is more specific than image (man vs person)
+    if len(q_hierarchy) > 1 and q_hierarchy[1] in i_hierarchy:
+        return 0.8
+    # Image is more specific than query
+    if len(i_hierarchy) > 1 and i_hierarchy[1] in q_hierarchy:
+        return _BEST_HIERARCHY_SCORE
+    # Same category
+    if q_hierarchy[-1] == i_hierarchy[-1]:
+        return 0.6
+    return 0.0
+
+
 def match_objects(query_objects: List[str], image_objects: List[str]) -> float:
     """
     Match objects with hierarchy-aware scoring.
@@ -94,31 +201,31 @@ def match_objects(query_objects: List[str], image_objects: List[str]) -> float:
     query_normalized = [normalize_object(o) for o in query_objects]
     image_normalized = [normalize_object(o) for o in image_objects]
     
+    # Exact match is the best possible score; skip hierarchy resolution entirely
+    if not set(query_normalized).isdisjoint(image_normalized):
+        return 1.0
+    
     best_score = 0.0
     
     for q_obj in query_normalized:
-        # Get hierarchy for query object
-        q_hierarchy = get_object_hierarchy(q_obj)
-        
         for i_obj in image_normalized:
-            i_hierarchy = get_object_hierarchy(i_obj)
-            
-            # Exact match
-            if q_obj == i_obj:
-                best_score = max(best_score, 1.0)
-            # Query is more specific than image (man vs person)
-            elif len(q_hierarchy) > 1 and q_hierarchy[1] in i_hierarchy:
-                best_score = max(best_score, 0.8)
-            # Image is more specific than query
-            elif len(i_hierarchy) > 1 and i_hierarchy[1] in q_hierarchy:
-                best_score = max(best_score, 0.9)
-            # Same category
-            elif q_hierarchy[-1] == i_hierarchy[-1]:
-                best_score = max(best_score, 0.6)
+            score = _hierarchy_score(q_obj, i_obj)
+            if score > best_score:
+                best_score = score
+                # 0.9 is the best non-exact score; nothing left can beat it
+                if best_score >= _BEST_HIERARCHY_SCORE:
+                    return best_score
     
     return best_score
 
 
+# Time term -> group of similar times
+_TIME_GROUP: Dict[str, str] = {
+    **{t: "night" for t in ("night", "nighttime", "dark", "evening", "midnight")},
+    **{t: "day" for t in ("day", "daytime", "afternoon", "bright", "midday")},
+}
+
+
 def match_time(query_time: str, image_time: Optional[str]) -> float:
     """Match time of day with fuzzy matching."""
     if not image_time:
@@ -130,13 +237,9 @@ def match_time(query_time: str, image_time: Optional[str]) -> float:
     if q == i:
         return 1.0
     
-    # Group similar times
-    night_variants = ["night", "nighttime", "dark", "evening", "midnight"]
-    day_variants = ["day", "daytime", "afternoon", "bright", "midday"]
-    
-    if q in night_variants and i in night_variants:
-        return 0.9
-    if q in day_variants and i in day_variants:
+    # Similar times share a group
+    q_group = _TIME_GROUP.get(q)
+    if q_group is not None and q_group == _TIME_GROUP.get(i):
         return 0.9
     
     return 0.0
@@ -165,17 +268,10 @@ def apply_relaxation(query_attrs: Dict, level: int = 0) -> Dict:
     if level >= 1:
         # Relax objects to their categories
         if relaxed.get("objects"):
-            new_objects = []
-            for obj in relaxed["objects"]:
-                normalized = normalize_object(obj)
-                # Check if it belongs to a category
-                for category, members in OBJECT_SYNONYMS.items():
-                    if normalized in members:
-                        new_objects.append(category)
-                        break
-                else:
-                    new_objects.append(normalized)
-            relaxed["objects"] = new_objects
+            relaxed["objects"] = [
+                get_object_category(normalized) or normalized
+                for normalized in map(normalize_object, relaxed["objects"])
+            ]
     
     if level >= 2:
         # Remove scene constraint
@@ -1,26 +1,73 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
 from uuid import UUID
 import numpy as np
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
 
-from config import QDRANT_HOST, QDRANT_PORT, SIGLIP_EMBEDDING_DIM, FACE_EMBEDDING_DIM
+from config import (
+    QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, SIGLIP_EMBEDDING_DIM, FACE_EMBEDDING_DIM,
+    QDRANT_QUANTIZATION, QDRANT_FACE_QUANTIZATION, QDRANT_FACE_DATATYPE, QDRANT_OVERSAMPLING,
+    QDRANT_MEMMAP_THRESHOLD_KB, QDRANT_HNSW_ON_DISK
+)
 
 # Global client cache
-_client: Optional[QdrantClient] = None
+_client: Optional[AsyncQdrantClient] = None
 
+# Collections known to exist, so existence checks only RPC once per collection
+_ensured_collections: Set[str] = set()
 
-def get_qdrant_client() -> QdrantClient:
-    """Get or initialize the Qdrant client (singleton)."""
+# Collections whose vector/quantization config has been checked this process
+_configured_collections: Set[str] = set()
+
+# Max points per upsert request
+UPSERT_BATCH_SIZE = 64
+
+# Search the quantized vectors first, then rescore the oversampled
+# shortlist with the original fp32 vectors
+SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(
+        ignore=False,
+        rescore=True,
+        oversampling=QDRANT_OVERSAMPLING
+    )
+)
+
+
+def get_qdrant_client() -> AsyncQdrantClient:
+    """Get or initialize the async Qdrant client (singleton, gRPC transport)."""
     global _client
     
     if _client is None:
-        _client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-        print(f"✅ Connected to Qdrant at {QDRANT_HOST}:{QDRANT_PORT}")
+        _client = AsyncQdrantClient(
+            host=QDRANT_HOST,
+            port=QDRANT_PORT,
+            grpc_port=QDRANT_GRPC_PORT,
+            prefer_grpc=True
+        )
+        print(f"✅ Connected to Qdrant at {QDRANT_HOST}:{QDRANT_GRPC_PORT} (gRPC)")
     
     return _client
 
 
+def get_quantization_config(mode: str = QDRANT_QUANTIZATION) -> Optional[models.QuantizationConfig]:
+    """Quantization config for a collection: "int8", "binary" or anything else for none."""
+    if mode == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    if mode == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    return None
+
+
 def get_images_collection_name(user_id: str) -> str:
     """Get the images collection name for a user."""
     return f"images_{user_id}"
@@ -31,6 +78,30 @@ def get_faces_collection_name(user_id: str) -> str:
     return f"faces_{user_id}"
 
 
+async def _collection_exists(collection_name: str) -> bool:
+    """Check whether a collection exists, remembering positive answers."""
+    if collection_name in _ensured_collections:
+        return True
+    
+    collections = (await get_qdrant_client().get_collections()).collections
+    if any(c.name == collection_name for c in collections):
+        _ensured_collections.add(collection_name)
+        return True
+    return False
+
+
+@lru_cache(maxsize=1)
+def _face_datatype():
+    """Vector datatype for new face collections, or None for the server default (float32)."""
+    if QDRANT_FACE_DATATYPE != "float16":
+        return None
+    # qdrant-client < 1.9 has no vector datatypes
+    if not hasattr(models, "Datatype"):
+        print("⚠️ QDRANT_FACE_DATATYPE=float16 needs qdrant-client >= 1.9; using float32")
+        return None
+    return models.Datatype.FLOAT16
+
+
 async def ensure_collection(user_id: str, collection_type: str = "images") -> None:
     """Ensure a collection exists for the user."""
     client = get_qdrant_client()
@@ -38,23 +109,180 @@ async def ensure_collection(user_id: str, collection_type: str = "images") -> No
     if collection_type == "images":
         collection_name = get_images_collection_name(user_id)
         vector_dim = SIGLIP_EMBEDDING_DIM
+        quantization_config = get_quantization_config(QDRANT_QUANTIZATION)
+        datatype = None
     else:
         collection_name = get_faces_collection_name(user_id)
         vector_dim = FACE_EMBEDDING_DIM
+        quantization_config = get_quantization_config(QDRANT_FACE_QUANTIZATION)
+        # Unit-norm face vectors lose nothing that matters to cosine ranking in fp16
+        datatype = _face_datatype()
+    
+    if collection_name in _configured_collections:
+        return
     
-    # Check if collection exists
-    collections = client.get_collections().collections
-    collection_names = [c.name for c in collections]
+    vector_params = {"datatype": datatype} if datatype is not None else {}
     
-    if collection_name not in collection_names:
-        client.create_collection(
+    if not await _collection_exists(collection_name):
+        await client.create_collection(
             collection_name=collection_name,
             vectors_config=models.VectorParams(
                 size=vector_dim,
-                distance=models.Distance.COSINE
+                distance=models.Distance.COSINE,
+                # With quantized copies in RAM, fp32 originals are only read for rescoring
+                on_disk=quantization_config is not None,
+                **vector_params
+            ),
+            quantization_config=quantization_config,
+            # Payloads are only read for returned points; keep them out of RAM
+            on_disk_payload=True,
+            hnsw_config=models.HnswConfigDiff(
+                m=16,
+                ef_construct=100,
+                on_disk=QDRANT_HNSW_ON_DISK
+            ),
+            # Large segments are mmapped so collections can outgrow RAM
+            optimizers_config=models.OptimizersConfigDiff(
+                memmap_threshold=QDRANT_MEMMAP_THRESHOLD_KB
             )
         )
         print(f"✅ Created collection: {collection_name}")
+    elif quantization_config is not None:
+        # Collections created before quantization was enabled still hold only fp32 vectors
+        info = await client.get_collection(collection_name)
+        if info.config.quantization_config is None:
+            await client.update_collection(
+                collection_name=collection_name,
+                quantization_config=quantization_config
+            )
+            print(f"✅ Enabled quantization on collection: {collection_name}")
+    
+    _ensured_collections.add(collection_name)
+    _configured_collections.add(collection_name)
+
+
+def _as_query_vector(embedding: np.ndarray) -> np.ndarray:
+    """Contiguous float32 view of a query embedding; the client accepts ndarrays directly."""
+    return np.ascontiguousarray(embedding, dtype=np.float32).ravel()
+
+
+def _as_vector_rows(embeddings: List[np.ndarray]) -> List[List[float]]:
+    """
+    Convert embeddings to the plain lists PointStruct validates against.
+    
+    Stacking first turns the whole batch into lists in one C-level tolist()
+    call instead of one call per point.
+    """
+    return np.ascontiguousarray(np.stack(embeddings), dtype=np.float32).tolist()
+
+
+def _is_missing_collection(error: Exception) -> bool:
+    """True if a Qdrant error (REST or gRPC) says the collection does not exist."""
+    return "not found" in str(error).lower()
+
+
+def _payload_selector(payload_fields: Optional[List[str]]) -> Union[bool, models.PayloadSelectorInclude]:
+    """Full payload for None, none for [], otherwise only the listed fields."""
+    if payload_fields is None:
+        return True
+    if not payload_fields:
+        return False
+    return models.PayloadSelectorInclude(include=payload_fields)
+
+
+async def _search(
+    collection_name: str,
+    query_embedding: np.ndarray,
+    top_k: int,
+    score_threshold: Optional[float],
+    payload_fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Search a collection, treating a missing collection as no results.
+    
+    The search itself is the existence probe, so the hot path costs one
+    round trip instead of a get_collections() call before every search.
+    """
+    try:
+        results = await get_qdrant_client().search(
+            collection_name=collection_name,
+            query_vector=_as_query_vector(query_embedding),
+            limit=top_k,
+            score_threshold=score_threshold,
+            search_params=SEARCH_PARAMS,
+            with_payload=_payload_selector(payload_fields)
+        )
+    except Exception as e:
+        if _is_missing_collection(e):
+            return []  # User has not uploaded anything yet
+        raise
+    
+    return [
+        {
+            "id": result.id,
+            "score": result.score,
+            "metadata": result.payload
+        }
+        for result in results
+    ]
+
+
+async def _upsert_in_batches(collection_name: str, points: List[models.PointStruct], batch_size: int) -> None:
+    """Send points in chunks of batch_size, with the chunk requests in flight concurrently."""
+    client = get_qdrant_client()
+    await asyncio.gather(*[
+        client.upsert(
+            collection_name=collection_name,
+            points=points[i:i + batch_size]
+        )
+        for i in range(0, len(points), batch_size)
+    ])
+
+
+async def upsert_image_embeddings_batch(
+    user_id: str,
+    items: List[Tuple[str, np.ndarray, Dict[str, Any]]],
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> None:
+    """Insert or update several (image_id, embedding, metadata) points in Qdrant."""
+    if not items:
+        return
+    
+    await ensure_collection(user_id, "images")
+    
+    vectors = _as_vector_rows([embedding for _, embedding, _ in items])
+    points = [
+        models.PointStruct(
+            id=image_id,
+            vector=vector,
+            payload={"image_id": image_id, **metadata}
+        )
+        for (image_id, _, metadata), vector in zip(items, vectors)
+    ]
+    await _upsert_in_batches(get_images_collection_name(user_id), points, batch_size)
+
+
+async def upsert_face_embeddings_batch(
+    user_id: str,
+    items: List[Tuple[str, np.ndarray, Dict[str, Any]]],
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> None:
+    """Insert or update several (face_id, embedding, metadata) points in Qdrant."""
+    if not items:
+        return
+    
+    await ensure_collection(user_id, "faces")
+    
+    vectors = _as_vector_rows([embedding for _, embedding, _ in items])
+    points = [
+        models.PointStruct(
+            id=face_id,
+            vector=vector,
+            payload={"face_id": face_id, **metadata}
+        )
+        for (face_id, _, metadata), vector in zip(items, vectors)
+    ]
+    await _upsert_in_batches(get_faces_collection_name(user_id), points, batch_size)
 
 
 async def upsert_image_embedding(
@@ -64,63 +292,93 @@ async def upsert_image_embedding(
     metadata: Dict[str, Any]
 ) -> None:
     """Insert or update an image embedding in Qdrant."""
-    client = get_qdrant_client()
-    collection_name = get_images_collection_name(user_id)
-    
-    # Ensure collection exists
-    await ensure_collection(user_id, "images")
-    
-    # Prepare payload
-    payload = {
-        "image_id": image_id,
-        **metadata
-    }
-    
-    # Upsert point
-    client.upsert(
-        collection_name=collection_name,
-        points=[
-            models.PointStruct(
-                id=image_id,
-                vector=embedding.tolist(),
-                payload=payload
-            )
-        ]
-    )
+    await upsert_image_embeddings_batch(user_id, [(image_id, embedding, metadata)])
 
 
 async def search_images(
     user_id: str,
     query_embedding: np.ndarray,
     top_k: int = 20,
-    score_threshold: Optional[float] = None
+    score_threshold: Optional[float] = None,
+    payload_fields: Optional[List[str]] = None
 ) -> List[Dict[str, Any]]:
-    """Search for similar images using embedding."""
-    client = get_qdrant_client()
-    collection_name = get_images_collection_name(user_id)
+    """
+    Search for similar images using embedding.
     
-    # Check if collection exists
-    collections = client.get_collections().collections
-    collection_names = [c.name for c in collections]
+    payload_fields limits the payload returned per hit (None = full payload);
+    hydrate the survivors afterwards with retrieve_image_payloads.
+    """
+    return await _search(
+        get_images_collection_name(user_id), query_embedding, top_k, score_threshold, payload_fields
+    )
+
+
+async def retrieve_image_payloads(user_id: str, image_ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+    """Fetch full payloads for specific image points, keyed by str(id)."""
+    if not image_ids:
+        return {}
     
-    if collection_name not in collection_names:
+    try:
+        records = await get_qdrant_client().retrieve(
+            collection_name=get_images_collection_name(user_id),
+            ids=image_ids,
+            with_payload=True,
+            with_vectors=False
+        )
+    except Exception as e:
+        if _is_missing_collection(e):
+            return {}
+        raise
+    
+    return {str(record.id): record.payload for record in records}
+
+
+async def search_images_multi(
+    user_id: str,
+    query_embeddings: List[np.ndarray],
+    top_k: int = 20,
+    score_threshold: Optional[float] = None,
+    payload_fields: Optional[List[str]] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Search for several query embeddings in one search_batch request.
+    
+    Returns one result list per embedding, in the same format as search_images.
+    """
+    if not query_embeddings:
         return []
     
-    # Search
-    results = client.search(
-        collection_name=collection_name,
-        query_vector=query_embedding.tolist(),
-        limit=top_k,
-        score_threshold=score_threshold
-    )
+    requests = [
+        models.SearchRequest(
+            vector=vector,
+            limit=top_k,
+            score_threshold=score_threshold,
+            params=SEARCH_PARAMS,
+            with_payload=_payload_selector(payload_fields)
+        )
+        for vector in _as_vector_rows(query_embeddings)
+    ]
+    
+    try:
+        batch_results = await get_qdrant_client().search_batch(
+            collection_name=get_images_collection_name(user_id),
+            requests=requests
+        )
+    except Exception as e:
+        if _is_missing_collection(e):
+            return [[] for _ in query_embeddings]
+        raise
     
     return [
-        {
-            "id": result.id,
-            "score": result.score,
-            "metadata": result.payload
-        }
-        for result in results
+        [
+            {
+                "id": result.id,
+                "score": result.score,
+                "metadata": result.payload
+            }
+            for result in results
+        ]
+        for results in batch_results
     ]
 
 
@@ -130,7 +388,7 @@ async def delete_image_embedding(user_id: str, image_id: str) -> None:
     collection_name = get_images_collection_name(user_id)
     
     try:
-        client.delete(
+        await client.delete(
             collection_name=collection_name,
             points_selector=models.PointIdsList(
                 points=[image_id]
@@ -147,45 +405,31 @@ async def upsert_face_embedding(
     metadata: Dict[str, Any]
 ) -> None:
     """Insert or update a face embedding in Qdrant."""
-    client = get_qdrant_client()
-    collection_name = get_faces_collection_name(user_id)
-    
-    # Ensure collection exists
-    await ensure_collection(user_id, "faces")
-    
-    # Prepare payload
-    payload = {
-        "face_id": face_id,
-        **metadata
-    }
-    
-    # Upsert point
-    client.upsert(
-        collection_name=collection_name,
-        points=[
-            models.PointStruct(
-                id=face_id,
-                vector=embedding.tolist(),
-                payload=payload
-            )
-        ]
-    )
+    await upsert_face_embeddings_batch(user_id, [(face_id, embedding, metadata)])
 
 
 async def delete_face_embedding(user_id: str, face_id: str) -> None:
     """Delete a face embedding from Qdrant."""
+    await delete_face_embeddings(user_id, [face_id])
+
+
+async def delete_face_embeddings(user_id: str, face_ids: List[str]) -> None:
+    """Delete several face embeddings from Qdrant in one request."""
+    if not face_ids:
+        return
+    
     client = get_qdrant_client()
     collection_name = get_faces_collection_name(user_id)
     
     try:
-        client.delete(
+        await client.delete(
             collection_name=collection_name,
             points_selector=models.PointIdsList(
-                points=[face_id]
+                points=face_ids
             )
         )
     except Exception:
-        pass  # Collection or point may not exist
+        pass  # Collection or points may not exist
 
 
 async def search_similar_faces(
@@ -195,28 +439,4 @@ async def search_similar_faces(
     score_threshold: float = 0.6
 ) -> List[Dict[str, Any]]:
     """Search for similar faces using embedding."""
-    client = get_qdrant_client()
-    collection_name = get_faces_collection_name(user_id)
-    
-    # Check if collection exists
-    collections = client.get_collections().collections
-    collection_names = [c.name for c in collections]
-    
-    if collection_name not in collection_names:
-        return []
-    
-    results = client.search(
-        collection_name=collection_name,
-        query_vector=query_embedding.tolist(),
-        limit=top_k,
-        score_threshold=score_threshold
-    )
-    
-    return [
-        {
-            "id": result.id,
-            "score": result.score,
-            "metadata": result.payload
-        }
-        for result in results
-    ]
+    return await _search(get_faces_collection_name(user_id), query_embedding, top_k, score_threshold)
@@ -0,0 +1,121 @@
+"""
+Per-user LRU cache of search results, with a near-duplicate query lookup.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+
+from config import (
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY,
+    REDIS_HOST, REDIS_PORT, TASK_QUEUE
+)
+
+
+class QueryCache:
+    """
+    Caches (query embedding, results) per user and search mode.
+    
+    Exact repeats are answered from a dict lookup before any encoding.
+    Near-duplicates are found by comparing the new query embedding against
+    all cached embeddings for that user in one matrix product.
+    
+    With shared=True (uploads indexed by a separate worker process), each
+    user's library version is kept in Redis so invalidations made by the
+    worker reach this process's cache.
+    """
+    
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 similarity: float = QUERY_CACHE_SIMILARITY, shared: bool = False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.shared = shared
+        # user_id -> OrderedDict[(mode, query, top_k)] -> (timestamp, embedding, results)
+        self._entries: Dict[str, OrderedDict] = {}
+        # user_id -> library version the cached entries were built against
+        self._versions: Dict[str, bytes] = {}
+        self._redis = None
+    
+    def _get_redis(self):
+        if self._redis is None:
+            self._redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        return self._redis
+    
+    async def sync(self, user_id: str) -> None:
+        """Drop a user's entries if another process changed their library."""
+        if not self.shared:
+            return
+        version = await self._get_redis().get(f"library_version:{user_id}")
+        if self._versions.get(user_id) != version:
+            self._entries.pop(user_id, None)
+            self._versions[user_id] = version
+    
+    def _user_entries(self, user_id: str) -> OrderedDict:
+        return self._entries.setdefault(user_id, OrderedDict())
+    
+    def _expired(self, timestamp: float) -> bool:
+        return time.time() - timestamp > self.ttl
+    
+    def get(self, user_id: str, mode: str, query: str, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for an exact (mode, query, top_k) match."""
+        entries = self._entries.get(user_id)
+        if not entries:
+            return None
+        
+        key = (mode, query, top_k)
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[0]):
+            del entries[key]
+            return None
+        
+        entries.move_to_end(key)
+        return entry[2]
+    
+    def get_similar(self, user_id: str, mode: str, top_k: int,
+                    embedding: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results of the most similar cached query above the threshold."""
+        entries = self._entries.get(user_id)
+        if not entries:
+            return None
+        
+        keys: List[Tuple] = []
+        vectors = []
+        for key, (timestamp, cached_embedding, _) in entries.items():
+            if key[0] == mode and key[2] == top_k and not self._expired(timestamp):
+                keys.append(key)
+                vectors.append(cached_embedding)
+        if not vectors:
+            return None
+        
+        scores = np.stack(vectors) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        
+        entries.move_to_end(keys[best])
+        return entries[keys[best]][2]
+    
+    def put(self, user_id: str, mode: str, query: str, top_k: int,
+            embedding: np.ndarray, results: List[Dict[str, Any]]) -> None:
+        """Store results, evicting the least recently used entry when full."""
+        entries = self._user_entries(user_id)
+        key = (mode, query, top_k)
+        entries[key] = (time.time(), embedding, results)
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+    
+    async def invalidate_user(self, user_id: str) -> None:
+        """Drop all cached results for a user (their library changed)."""
+        self._entries.pop(user_id, None)
+        if self.shared:
+            await self._get_redis().incr(f"library_version:{user_id}")
+
+
+# Global cache instance
+query_cache = QueryCache(shared=TASK_QUEUE == "arq")
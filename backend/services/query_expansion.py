@@ -3,9 +3,14 @@ Query expansion service - maps user queries to related semantic terms.
 Improves search recall by searching for synonyms and related concepts.
 """
 
-from typing import List, Dict, Set
+from itertools import chain
+from typing import List, Dict, Set, Tuple
 import json
 
+from rapidfuzz import fuzz, process
+
+from services.vocabulary import tokenize_query
+
 # Semantic expansion mappings
 QUERY_EXPANSIONS = {
     # Animals
@@ -91,8 +96,17 @@ QUERY_EXPANSIONS = {
 # Lowercase version for case-insensitive lookup
 QUERY_EXPANSIONS_LOWER = {k.lower(): v for k, v in QUERY_EXPANSIONS.items()}
 
+# Normalized, de-duplicated expansions per key, so callers don't re-clean terms per query
+_EXPANSIONS_FROZEN = {
+    k: tuple(dict.fromkeys(t.strip().lower() for t in v if t.strip()))
+    for k, v in QUERY_EXPANSIONS_LOWER.items()
+}
+
+# Choices for fuzzy matching, built once instead of on every call
+_EXPANSION_KEYS = tuple(QUERY_EXPANSIONS_LOWER.keys())
+
 
-def expand_query(query: str) -> List[str]:
+def expand_query(query: str) -> Tuple[str, ...]:
     """
     Expand a query to include synonyms and related terms.
     
@@ -100,17 +114,16 @@ def expand_query(query: str) -> List[str]:
         query: User's search query (single word or phrase)
         
     Returns:
-        List of expanded query terms
+        Tuple of expanded query terms (shared; do not mutate)
     """
-    query_lower = query.lower().strip()
+    query_lower, words = tokenize_query(query)
     
-    # Direct match
-    if query_lower in QUERY_EXPANSIONS_LOWER:
-        return QUERY_EXPANSIONS_LOWER[query_lower]
+    # Direct match: the precomputed tuple, no copy
+    if query_lower in _EXPANSIONS_FROZEN:
+        return _EXPANSIONS_FROZEN[query_lower]
     
     # Check for partial matches (e.g., "dog" in "dog running")
     results = set()
-    words = query_lower.split()
     
     for word in words:
         if word in QUERY_EXPANSIONS_LOWER:
@@ -118,13 +131,13 @@ def expand_query(query: str) -> List[str]:
     
     # If we found expansions, return them
     if results:
-        return list(results)
+        return tuple(results)
     
     # Fallback: return original query
-    return [query_lower]
+    return (query_lower,)
 
 
-def expand_query_multi_word(query: str) -> List[str]:
+def expand_query_multi_word(query: str) -> Tuple[str, ...]:
     """
     Expand multi-word queries by expanding individual words and combining.
     
@@ -134,27 +147,14 @@ def expand_query_multi_word(query: str) -> List[str]:
         query: User's search query (can be multi-word)
         
     Returns:
-        List of all expanded terms
+        Tuple of all expanded terms
     """
-    query_lower = query.lower().strip()
-
-    # Split into words
-    words = query_lower.split()
-
-    # Expand each word, preserving order and de-duplicating
-    ordered: List[str] = []
-    seen = set()
-
-    for word in words:
-        candidates = QUERY_EXPANSIONS_LOWER.get(word, [word])
-        for term in candidates:
-            term = term.strip().lower()
-            if not term or term in seen:
-                continue
-            seen.add(term)
-            ordered.append(term)
+    _, words = tokenize_query(query)
 
-    return ordered
+    # Expand each word; dict.fromkeys keeps first-seen order while de-duplicating
+    return tuple(dict.fromkeys(chain.from_iterable(
+        _EXPANSIONS_FROZEN.get(word, (word,)) for word in words
+    )))
 
 
 def get_primary_term(query: str) -> str:
@@ -170,14 +170,13 @@ def get_primary_term(query: str) -> str:
     Returns:
         The primary term (or original query if no match)
     """
-    query_lower = query.lower().strip()
+    query_lower, words = tokenize_query(query)
     
     # Try direct match first
     if query_lower in QUERY_EXPANSIONS_LOWER:
         return query_lower
     
     # Try individual words
-    words = query_lower.split()
     for word in words:
         if word in QUERY_EXPANSIONS_LOWER:
             return word
@@ -196,7 +195,7 @@ def get_query_context(query: str) -> Dict[str, any]:
     Returns:
         Dictionary with query context
     """
-    query_lower = query.lower().strip()
+    query_lower, _ = tokenize_query(query)
     primary_term = get_primary_term(query)
     expansions = expand_query_multi_word(query)
     
@@ -210,12 +209,26 @@ def get_query_context(query: str) -> Dict[str, any]:
     }
 
 
+def _similar_term_matches(query: str, threshold: float) -> List[Tuple[str, float]]:
+    """(term, score 0-100) for every expansion term at or above threshold, in mapping order."""
+    query_lower, _ = tokenize_query(query)
+    matches = process.extract(
+        query_lower,
+        _EXPANSION_KEYS,
+        scorer=fuzz.ratio,
+        score_cutoff=threshold * 100,
+        limit=None
+    )
+    return [(term, score) for term, score, _ in sorted(matches, key=lambda m: m[2])]
+
+
 # Similarity-based term matching (for typos)
 def find_similar_terms(query: str, threshold: float = 0.7) -> List[str]:
     """
     Find similar expansion terms even if not exact match (handles typos).
     
-    Uses simple character overlap heuristic.
+    Uses rapidfuzz's native Indel ratio (the metric SequenceMatcher.ratio
+    approximates), scoring all terms in one call.
     
     Args:
         query: User's search query
@@ -224,17 +237,7 @@ def find_similar_terms(query: str, threshold: float = 0.7) -> List[str]:
     Returns:
         List of similar recognized terms
     """
-    from difflib import SequenceMatcher
-    
-    query_lower = query.lower().strip()
-    similar = []
-    
-    for term in QUERY_EXPANSIONS_LOWER.keys():
-        ratio = SequenceMatcher(None, query_lower, term).ratio()
-        if ratio >= threshold:
-            similar.append(term)
-    
-    return similar
+    return [term for term, _ in _similar_term_matches(query, threshold)]
 
 
 def create_query_variants(query: str) -> Dict[str, List[str]]:
@@ -247,11 +250,17 @@ def create_query_variants(query: str) -> Dict[str, List[str]]:
     Returns:
         Dictionary with different query approaches
     """
+    primary_term = get_primary_term(query)
+    
+    # One scoring pass at 0.6; the default 0.7 threshold only gates whether any are used
+    similar = _similar_term_matches(query, threshold=0.6)
+    has_close_match = any(score >= 70 for _, score in similar)
+    
     return {
         "direct": [query],
         "expanded": expand_query_multi_word(query),
-        "primary_only": [get_primary_term(query)] if get_primary_term(query) in QUERY_EXPANSIONS_LOWER else [],
-        "similar": find_similar_terms(query, threshold=0.6) if find_similar_terms(query) else []
+        "primary_only": [primary_term] if primary_term in QUERY_EXPANSIONS_LOWER else [],
+        "similar": [term for term, _ in similar] if has_close_match else []
     }
 
 
@@ -1,7 +1,51 @@
+from itertools import chain
 from typing import Dict, List, Optional
 import re
 
-from services.vocabulary import OBJECT_SYNONYMS, ACTION_SYNONYMS, TIME_SYNONYMS, SCENE_SYNONYMS
+import ahocorasick
+
+from services.vocabulary import OBJECT_SYNONYMS, ACTION_SYNONYMS, TIME_SYNONYMS, SCENE_SYNONYMS, tokenize_query
+
+
+def _vocabulary_terms(synonyms: Dict[str, List[str]]) -> frozenset:
+    """All canonical terms and their synonyms as one set."""
+    return frozenset(chain.from_iterable([canonical, *members] for canonical, members in synonyms.items()))
+
+
+# Built once at import instead of on every parse_query call
+_ALL_OBJECTS = _vocabulary_terms(OBJECT_SYNONYMS)
+_ALL_ACTIONS = _vocabulary_terms(ACTION_SYNONYMS)
+_ALL_TIMES = _vocabulary_terms(TIME_SYNONYMS)
+_ALL_SCENES = _vocabulary_terms(SCENE_SYNONYMS)
+
+# Token -> bit flags of the vocabularies it belongs to, so one lookup per token covers all four
+_OBJECT, _ACTION, _TIME, _SCENE = 1, 2, 4, 8
+_TOKEN_KINDS: Dict[str, int] = {}
+for _kind, _terms in ((_OBJECT, _ALL_OBJECTS), (_ACTION, _ALL_ACTIONS), (_TIME, _ALL_TIMES), (_SCENE, _ALL_SCENES)):
+    for _term in _terms:
+        _TOKEN_KINDS[_term] = _TOKEN_KINDS.get(_term, 0) | _kind
+
+PERSON_PATTERNS = ["young man", "old man", "young woman", "old woman", "little boy", "little girl"]
+NIGHT_PHRASES = ["at night", "during night"]
+DAY_PHRASES = ["at day", "during day", "daytime"]
+STREET_PHRASES = ["on the street", "on street"]
+BEACH_PHRASES = ["at the beach", "on beach"]
+PARK_PHRASES = ["in the park", "at park"]
+WEATHER_TERMS = ["sunny", "rainy", "cloudy", "snowy", "foggy", "stormy", "clear"]
+EMOTION_TERMS = ["happy", "sad", "angry", "surprised", "scared", "smiling", "laughing", "crying"]
+
+
+def _build_phrase_automaton() -> ahocorasick.Automaton:
+    """One Aho-Corasick automaton over every substring pattern parse_query checks."""
+    automaton = ahocorasick.Automaton()
+    for phrase in chain(PERSON_PATTERNS, NIGHT_PHRASES, DAY_PHRASES, STREET_PHRASES,
+                        BEACH_PHRASES, PARK_PHRASES, WEATHER_TERMS, EMOTION_TERMS):
+        automaton.add_word(phrase, phrase)
+    automaton.make_automaton()
+    return automaton
+
+
+_PHRASE_AUTOMATON = _build_phrase_automaton()
 
 
 def parse_query(query: str) -> Dict[str, any]:
@@ -13,8 +57,10 @@ def parse_query(query: str) -> Dict[str, any]:
         "man walking at night" → {"object": "man", "action": "walking", "time": "night"}
         "happy dog" → {"object": "dog", "emotion": "happy"}
     """
-    query_lower = query.lower().strip()
-    tokens = query_lower.split()
+    query_lower, tokens = tokenize_query(query)
+    
+    # Every pattern occurring in the query (overlaps included), found in one scan
+    matched = {phrase for _, phrase in _PHRASE_AUTOMATON.iter(query_lower)}
     
     result = {
         "objects": [],
@@ -26,88 +72,56 @@ def parse_query(query: str) -> Dict[str, any]:
         "raw_query": query
     }
     
-    # Extract objects
-    all_objects = set()
-    for category, synonyms in OBJECT_SYNONYMS.items():
-        all_objects.add(category)
-        all_objects.update(synonyms)
-    
+    # Extract objects, action, time and scene in one pass over the tokens
+    action = None
+    ing_action = None
     for token in tokens:
-        if token in all_objects:
+        kinds = _TOKEN_KINDS.get(token, 0)
+        if kinds & _OBJECT:
             result["objects"].append(token)
+        if kinds & _ACTION:
+            if action is None:
+                action = token
+        elif ing_action is None and token.endswith("ing"):
+            # -ing forms that might be actions
+            ing_action = token
+        if kinds & _TIME and result["time"] is None:
+            result["time"] = token
+        if kinds & _SCENE and result["scene"] is None:
+            result["scene"] = token
+    
+    # An unrecognized -ing verb takes precedence over a vocabulary action
+    result["action"] = ing_action if ing_action is not None else action
     
     # Also check multi-word patterns
-    person_patterns = ["young man", "old man", "young woman", "old woman", "little boy", "little girl"]
-    for pattern in person_patterns:
-        if pattern in query_lower:
+    for pattern in PERSON_PATTERNS:
+        if pattern in matched:
             # Extract the specific term
             result["objects"].append(pattern.split()[-1])  # e.g., "man", "woman"
     
-    # Extract action
-    all_actions = set()
-    for canonical, synonyms in ACTION_SYNONYMS.items():
-        all_actions.add(canonical)
-        all_actions.update(synonyms)
-    
-    for token in tokens:
-        if token in all_actions:
-            result["action"] = token
-            break
-    
-    # Check for -ing forms that might be actions
-    for token in tokens:
-        if token.endswith("ing") and token not in all_actions:
-            # Could be an action verb
-            result["action"] = token
-            break
-    
-    # Extract time
-    all_times = set()
-    for canonical, synonyms in TIME_SYNONYMS.items():
-        all_times.add(canonical)
-        all_times.update(synonyms)
-    
-    for token in tokens:
-        if token in all_times:
-            result["time"] = token
-            break
-    
     # Check for time phrases
-    if "at night" in query_lower or "during night" in query_lower:
+    if not matched.isdisjoint(NIGHT_PHRASES):
         result["time"] = "night"
-    elif "at day" in query_lower or "during day" in query_lower or "daytime" in query_lower:
+    elif not matched.isdisjoint(DAY_PHRASES):
         result["time"] = "day"
     
-    # Extract scene
-    all_scenes = set()
-    for canonical, synonyms in SCENE_SYNONYMS.items():
-        all_scenes.add(canonical)
-        all_scenes.update(synonyms)
-    
-    for token in tokens:
-        if token in all_scenes:
-            result["scene"] = token
-            break
-    
     # Check for scene phrases
-    if "on the street" in query_lower or "on street" in query_lower:
+    if not matched.isdisjoint(STREET_PHRASES):
         result["scene"] = "street"
-    elif "at the beach" in query_lower or "on beach" in query_lower:
+    elif not matched.isdisjoint(BEACH_PHRASES):
         result["scene"] = "beach"
-    elif "in the park" in query_lower or "at park" in query_lower:
+    elif not matched.isdisjoint(PARK_PHRASES):
         result["scene"] = "park"
     
     # Extract weather
-    weather_terms = ["sunny", "rainy", "cloudy", "snowy", "foggy", "stormy", "clear"]
-    for term in weather_terms:
-        if term in query_lower:
+    for term in WEATHER_TERMS:
+        if term in matched:
             result["weather"] = term
             break
     
     # Extract emotion
-    emotion_terms = ["happy", "sad", "angry", "surprised", "scared", "smiling", "laughing", "crying"]
-    for term in emotion_terms:
-        if term in query_lower:
+    for term in EMOTION_TERMS:
+        if term in matched:
             result["emotion"] = term
             break
     
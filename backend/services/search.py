@@ -1,15 +1,49 @@
+import asyncio
 from typing import List, Dict, Any
 from uuid import UUID
 from PIL import Image
+import numpy as np
 
-from services.embeddings import encode_text, calibrate_siglip_score
-from services.qdrant import search_images
+from services.embeddings import encode_text, encode_texts, calibrate_siglip_scores, save_text_embedding_cache
+from services.qdrant import search_images, search_images_multi, retrieve_image_payloads
 from services.query_parser import parse_query, get_query_importance
-from services.metadata_matcher import compute_match_score, apply_relaxation
-from services.storage import get_image_path
-from services.query_expansion import expand_query_multi_word, get_primary_term
+from services.metadata_matcher import compute_match_scores_batch, apply_relaxation, SCORING_FIELDS
+from services.query_expansion import expand_query_multi_word, get_primary_term, QUERY_EXPANSIONS_LOWER
+from services.vocabulary import OBJECT_SYNONYMS, ACTION_SYNONYMS, TIME_SYNONYMS, SCENE_SYNONYMS
+from services.query_cache import query_cache
 from config import NORMAL_SEARCH_TOP_K, DEEP_SEARCH_CANDIDATE_K, DEEP_SEARCH_FINAL_K
 
+# services.vlm pulls in torch + transformers; resolved once on first VLM validation
+_validate_image_for_query = None
+
+
+def _get_vlm_validator():
+    global _validate_image_for_query
+    if _validate_image_for_query is None:
+        from services.vlm import validate_image_for_query
+        _validate_image_for_query = validate_image_for_query
+    return _validate_image_for_query
+
+
+def warm_text_embedding_cache() -> None:
+    """
+    Pre-encode the vocabulary and expansion terms so common search terms
+    never hit the text encoder on the request path. Call once at startup.
+    
+    encode_texts reads back embeddings saved by a previous run first, so only
+    terms it never saw are encoded; the merged cache is saved again afterwards.
+    """
+    terms = {
+        term
+        for synonyms in (OBJECT_SYNONYMS, ACTION_SYNONYMS, TIME_SYNONYMS, SCENE_SYNONYMS)
+        for canonical, members in synonyms.items()
+        for term in (canonical, *members)
+    }
+    for key in QUERY_EXPANSIONS_LOWER:
+        terms.update(expand_query_multi_word(key))
+    encode_texts(sorted(terms))
+    save_text_embedding_cache()
+
 
 async def normal_search(
     query: str,
@@ -23,63 +57,89 @@ async def normal_search(
     This is the default search mode optimized for speed and good recall.
     Automatically searches for query variations to improve hit rate.
     """
-    # Step 1: Build ordered term list (exact query first)
     normalized_query = query.strip().lower()
+    
+    # Exact repeat: skip encoding and Qdrant entirely
+    await query_cache.sync(user_id)
+    cached = query_cache.get(user_id, "normal", normalized_query, top_k)
+    if cached is not None:
+        return cached
+    
+    # Near-duplicate of a cached query: skip expansion and Qdrant
+    query_embedding = await asyncio.to_thread(encode_text, normalized_query)
+    cached = query_cache.get_similar(user_id, "normal", top_k, query_embedding)
+    if cached is not None:
+        return cached
+    
+    # Step 1: Build ordered term list (exact query first)
     expanded_terms = expand_query_multi_word(query)
     ordered_terms = [normalized_query] + [t for t in expanded_terms if t != normalized_query]
 
     # Step 2: Search with each term and aggregate results
-    # We keep the best *direct* match and best *expanded* match separately,
-    # then prefer direct intent unless the expanded hit is much better.
-    direct_best: Dict[Any, Dict[str, Any]] = {}
-    expanded_best: Dict[Any, Dict[str, Any]] = {}
-
     max_terms = 6 if len(normalized_query.split()) <= 2 else 10
     max_terms = min(max_terms, len(ordered_terms))
 
     # Penalty to prevent synonyms overwhelming the exact query intent
     expansion_penalty = 0.85
 
-    for term in ordered_terms[:max_terms]:
-        term_embedding = encode_text(term)
-        results = await search_images(user_id, term_embedding, min(top_k, 10))
+    search_terms = ordered_terms[:max_terms]
+    term_k = min(top_k, 10)
 
-        for r in results:
-            image_id = r["id"]
+    # Per-term results are cached across queries, so expansion terms shared
+    # with an earlier query ("dog" for "puppy" and "dog park") skip both
+    # encoding and Qdrant
+    term_results = [query_cache.get(user_id, "term", term, term_k) for term in search_terms]
+    missing = [i for i, results in enumerate(term_results) if results is None]
 
-            raw_score = r["score"]
-            calibrated_score = calibrate_siglip_score(raw_score)
+    if missing:
+        # Encode the uncached expansion terms in a single forward pass, off the event loop
+        to_encode = [search_terms[i] for i in missing if i != 0]
+        encoded = iter(await asyncio.to_thread(encode_texts, to_encode))
+        term_embeddings = {i: query_embedding if i == 0 else next(encoded) for i in missing}
 
-            record = {
-                "id": image_id,
-                "metadata": r["metadata"],
-                "score": calibrated_score,
-                "raw_score": raw_score,
-                "matched_term": term,
-            }
+        # All per-term searches go to Qdrant in one search_batch request; only
+        # ids and scores are needed to rank, payloads are fetched for the top_k below
+        fetched = await search_images_multi(
+            user_id, [term_embeddings[i] for i in missing], term_k, payload_fields=[]
+        )
+        for i, results in zip(missing, fetched):
+            term_results[i] = results
+            query_cache.put(user_id, "term", search_terms[i], term_k, term_embeddings[i], results)
 
-            if term == normalized_query:
-                prev = direct_best.get(image_id)
-                if prev is None or record["score"] > prev["score"]:
-                    direct_best[image_id] = record
-            else:
-                # Apply a small penalty so exact query stays on top when close
-                record["score"] = record["score"] * expansion_penalty
-                prev = expanded_best.get(image_id)
-                if prev is None or record["score"] > prev["score"]:
-                    expanded_best[image_id] = record
-
-    # Merge, preferring direct results when present
-    all_results: Dict[Any, Dict[str, Any]] = dict(expanded_best)
-    all_results.update(direct_best)
-    
-    if not all_results:
+    # Flatten every hit into parallel arrays and reduce per image in NumPy
+    hits = [(term_index, r) for term_index, results in enumerate(term_results) for r in results]
+    if not hits:
         return []
-    
+
+    term_index = np.fromiter((t for t, _ in hits), dtype=np.int64, count=len(hits))
+    raw_scores = np.fromiter((r["score"] for _, r in hits), dtype=np.float64, count=len(hits))
+    is_direct = term_index == 0
+    # Apply a small penalty so exact query stays on top when close
+    scores = calibrate_siglip_scores(raw_scores) * np.where(is_direct, 1.0, expansion_penalty)
+
+    # Best hit per image: a direct hit always wins over expanded ones, so the
+    # exact query intent is preferred; otherwise the highest score. lexsort
+    # is stable, so the earliest hit wins ties
+    _, image_codes = np.unique([r["id"] for _, r in hits], return_inverse=True)
+    by_image = np.lexsort((-scores, ~is_direct, image_codes))
+    _, group_starts = np.unique(image_codes[by_image], return_index=True)
+    best = np.sort(by_image[group_starts])
+
     # Step 3: Sort by score and format results
-    sorted_results = sorted(all_results.values(), key=lambda x: x["score"], reverse=True)
-    
-    return [
+    ranked = best[np.argsort(-scores[best], kind="stable")][:top_k]
+    payloads = await retrieve_image_payloads(user_id, [hits[i][1]["id"] for i in ranked])
+    sorted_results = [
+        {
+            "id": hits[i][1]["id"],
+            "metadata": payloads.get(str(hits[i][1]["id"])) or {},
+            "score": float(scores[i]),
+            "raw_score": hits[i][1]["score"],
+            "matched_term": search_terms[term_index[i]],
+        }
+        for i in ranked
+    ]
+
+    results = [
         {
             "id": UUID(r["id"]) if isinstance(r["id"], str) else r["id"],
             "filename": r["metadata"].get("filename", ""),
@@ -91,8 +151,18 @@ async def normal_search(
                 if k not in ["image_id", "filename", "thumbnail_path"]
             }
         }
-        for r in sorted_results[:top_k]
+        for r in sorted_results
     ]
+    query_cache.put(user_id, "normal", normalized_query, top_k, query_embedding, results)
+    return results
+
+
+def _attrs_signature(attrs: Dict) -> tuple:
+    """Hashable snapshot of parsed query attributes, for spotting no-op relaxations."""
+    return tuple(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in sorted(attrs.items())
+    )
 
 
 async def deep_search(
@@ -113,9 +183,23 @@ async def deep_search(
     
     This mode is slower but more precise for complex queries.
     """
+    normalized_query = " ".join(query.lower().split())
+    await query_cache.sync(user_id)
+    cached = query_cache.get(user_id, "deep", normalized_query, top_k)
+    if cached is not None:
+        return cached
+    
     # Step 1: Vector recall with expanded candidate pool
-    query_embedding = encode_text(query)
-    candidates = await search_images(user_id, query_embedding, DEEP_SEARCH_CANDIDATE_K)
+    query_embedding = await asyncio.to_thread(encode_text, query)
+    cached = query_cache.get_similar(user_id, "deep", top_k, query_embedding)
+    if cached is not None:
+        return cached
+    
+    # Candidates only carry the fields the metadata scorer reads; the full
+    # payload is fetched below for the top_k survivors only
+    candidates = await search_images(
+        user_id, query_embedding, DEEP_SEARCH_CANDIDATE_K, payload_fields=SCORING_FIELDS
+    )
     
     if not candidates:
         return []
@@ -124,57 +208,75 @@ async def deep_search(
     query_attrs = parse_query(query)
     weights = get_query_importance(query_attrs)
     
-    # Step 3: Score candidates with metadata matching
-    scored_candidates = []
-    for candidate in candidates:
-        metadata = candidate["metadata"]
-        
-        # Compute metadata match score
-        meta_score = compute_match_score(query_attrs, metadata, weights)
-        
-        # Calibrate raw embedding score and combine with metadata score
-        # Embedding score is calibrated from cosine similarity to 0-1 confidence
-        raw_embedding_score = candidate["score"]
-        embedding_score = calibrate_siglip_score(raw_embedding_score)
-        combined_score = (0.6 * embedding_score) + (0.4 * meta_score)
-        
-        scored_candidates.append({
-            "id": candidate["id"],
-            "metadata": metadata,
-            "embedding_score": embedding_score,
-            "meta_score": meta_score,
-            "combined_score": combined_score
-        })
+    # Step 3: Score all candidates with metadata matching in one batch
+    metadata_batch = [candidate["metadata"] for candidate in candidates]
+    # Per-(field, query value) scores, shared with the relaxation passes below
+    score_cache: Dict[tuple, Dict[Any, float]] = {}
+    meta_scores = compute_match_scores_batch(query_attrs, metadata_batch, weights, score_cache)
     
-    # Step 4: Check if we have enough good results, otherwise apply relaxation
-    good_results = [c for c in scored_candidates if c["combined_score"] > 0.5]
+    # Calibrate raw embedding scores and combine with metadata scores
+    # Embedding score is calibrated from cosine similarity to 0-1 confidence
+    raw_scores = np.fromiter((c["score"] for c in candidates), dtype=np.float64, count=len(candidates))
+    embedding_scores = calibrate_siglip_scores(raw_scores)
+    combined_scores = (0.6 * embedding_scores) + (0.4 * meta_scores)
     
-    if len(good_results) < top_k:
-        # Apply relaxation levels progressively
+    # Step 4: Check if we have enough good results, otherwise apply relaxation
+    if np.count_nonzero(combined_scores > 0.5) < top_k:
+        # Relaxed attributes depend only on the query, so build every level up
+        # front; a level that relaxed nothing (e.g. no scene to drop) can't
+        # change any score and is dropped
+        relaxation_levels = []
+        prev_signature = _attrs_signature(query_attrs)
         for level in range(1, 4):
             relaxed_attrs = apply_relaxation(query_attrs, level)
+            signature = _attrs_signature(relaxed_attrs)
+            if signature != prev_signature:
+                relaxation_levels.append(relaxed_attrs)
+                prev_signature = signature
+        
+        # Apply relaxation levels progressively
+        for relaxed_attrs in relaxation_levels:
+            # Perfect metadata matches can't improve; rescore the rest and
+            # only keep relaxed scores where they improve the match
+            rows = np.flatnonzero(meta_scores < 1.0)
+            if rows.size == 0:
+                break
+            relaxed_scores = compute_match_scores_batch(
+                relaxed_attrs, [metadata_batch[i] for i in rows], weights, score_cache
+            )
+            meta_scores[rows] = np.maximum(meta_scores[rows], relaxed_scores)
+            combined_scores = (0.6 * embedding_scores) + (0.4 * meta_scores)
             
-            for candidate in scored_candidates:
-                new_meta_score = compute_match_score(relaxed_attrs, candidate["metadata"], weights)
-                # Only update if it improves the score
-                if new_meta_score > candidate["meta_score"]:
-                    candidate["meta_score"] = new_meta_score
-                    candidate["combined_score"] = (0.6 * candidate["embedding_score"]) + (0.4 * new_meta_score)
-            
-            good_results = [c for c in scored_candidates if c["combined_score"] > 0.5]
-            if len(good_results) >= top_k:
+            if np.count_nonzero(combined_scores > 0.5) >= top_k:
                 break
     
-    # Step 5: Sort by combined score and take top_k
-    scored_candidates.sort(key=lambda x: x["combined_score"], reverse=True)
-    top_results = scored_candidates[:top_k]
+    # Step 5: Take top_k by combined score; only the selected rows get sorted
+    if top_k < len(combined_scores):
+        selected = np.argpartition(-combined_scores, top_k)[:top_k]
+    else:
+        selected = np.arange(len(combined_scores))
+    order = selected[np.argsort(-combined_scores[selected], kind="stable")]
+    top_results = [
+        {
+            "id": candidates[i]["id"],
+            "metadata": metadata_batch[i],
+            "embedding_score": float(embedding_scores[i]),
+            "meta_score": float(meta_scores[i]),
+            "combined_score": float(combined_scores[i])
+        }
+        for i in order
+    ]
+    
+    payloads = await retrieve_image_payloads(user_id, [r["id"] for r in top_results])
+    for r in top_results:
+        r["metadata"] = payloads.get(str(r["id"]), r["metadata"])
     
     # Step 6: Optional VLM validation for top results
     # Commented out for performance - enable for highest accuracy
     # validated_results = await vlm_validate_results(query, top_results[:10])
     
     # Format results
-    return [
+    results = [
         {
             "id": UUID(r["id"]) if isinstance(r["id"], str) else r["id"],
             "filename": r["metadata"].get("filename", ""),
@@ -187,6 +289,8 @@ async def deep_search(
         }
         for r in top_results
     ]
+    query_cache.put(user_id, "deep", normalized_query, top_k, query_embedding, results)
+    return results
 
 
 async def vlm_validate_results(
@@ -198,7 +302,7 @@ async def vlm_validate_results(
     Use VLM to validate top candidates against the query.
     This is expensive but provides highest accuracy.
     """
-    from services.vlm import validate_image_for_query
+    validate_image_for_query = _get_vlm_validator()
     
     validated = []
     
@@ -1,4 +1,6 @@
+import asyncio
 import os
+from typing import Tuple
 import aiofiles
 from uuid import uuid4, UUID
 from pathlib import Path
@@ -9,6 +11,26 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import IMAGES_DIR, THUMBNAILS_DIR, THUMBNAIL_SIZE, ALLOWED_EXTENSIONS
 from models import Image
 
+# Bytes read from the upload per write
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def _make_thumbnail(file_path: Path, thumb_path: Path) -> Tuple[int, int]:
+    """Write a WEBP thumbnail and return its size, or (0, 0) if the image can't be read."""
+    try:
+        with PILImage.open(file_path) as img:
+            # Shrink-on-load for JPEGs: libjpeg decodes at a DCT scale (1/2, 1/4, 1/8)
+            # just above the thumbnail size instead of the full resolution; no-op otherwise
+            img.draft("RGB", THUMBNAIL_SIZE)
+            img.thumbnail(THUMBNAIL_SIZE)
+            # Convert to RGB if necessary (for RGBA images)
+            if img.mode in ("RGBA", "P"):
+                img = img.convert("RGB")
+            img.save(thumb_path, "WEBP", quality=80)
+            return img.size
+    except Exception:
+        return 0, 0
+
 
 async def save_image(file: UploadFile, user_id: UUID, db: AsyncSession) -> Image:
     """Save uploaded image to filesystem and create database record."""
@@ -30,22 +52,15 @@ async def save_image(file: UploadFile, user_id: UUID, db: AsyncSession) -> Image
     thumb_filename = f"{image_id}_thumb.webp"
     thumb_path = user_thumbs_dir / thumb_filename
     
-    # Save original file
-    content = await file.read()
+    # Save original file, streamed in chunks so the whole upload is never held in memory
+    file_size = 0
     async with aiofiles.open(file_path, "wb") as f:
-        await f.write(content)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+            file_size += len(chunk)
     
-    # Create thumbnail
-    try:
-        with PILImage.open(file_path) as img:
-            img.thumbnail(THUMBNAIL_SIZE)
-            # Convert to RGB if necessary (for RGBA images)
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            img.save(thumb_path, "WEBP", quality=80)
-            width, height = img.size
-    except Exception:
-        width, height = 0, 0
+    # Create thumbnail off the event loop; decode/resize/encode is CPU-bound
+    width, height = await asyncio.to_thread(_make_thumbnail, file_path, thumb_path)
     
     # Create database record
     image = Image(
@@ -55,10 +70,10 @@ async def save_image(file: UploadFile, user_id: UUID, db: AsyncSession) -> Image
         original_filename=original_filename,
         file_path=str(file_path.relative_to(IMAGES_DIR.parent)),
         thumbnail_path=str(thumb_path.relative_to(THUMBNAILS_DIR.parent)),
-        file_size=str(len(content)),
+        file_size=file_size,
         mime_type=file.content_type,
-        width=str(width),
-        height=str(height),
+        width=width,
+        height=height,
         processing_status="pending"
     )
     
@@ -1,4 +1,5 @@
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 import re
 
 # Vocabulary mappings for normalization
@@ -35,15 +36,52 @@ SCENE_SYNONYMS = {
 }
 
 
+def _canonical_lookup(synonyms: Dict[str, List[str]]) -> Dict[str, str]:
+    """Term -> canonical form; the first category listing a term wins, as in a linear scan."""
+    lookup: Dict[str, str] = {}
+    for canonical, members in synonyms.items():
+        for term in (canonical, *members):
+            lookup.setdefault(term, canonical)
+    return lookup
+
+
+# Built once so normalization is a dict lookup instead of a scan over every category
+_OBJECT_CANONICAL = _canonical_lookup(OBJECT_SYNONYMS)
+_ACTION_CANONICAL = _canonical_lookup(ACTION_SYNONYMS)
+_TIME_CANONICAL = _canonical_lookup(TIME_SYNONYMS)
+_SCENE_CANONICAL = _canonical_lookup(SCENE_SYNONYMS)
+
+# Object member -> category (categories themselves excluded); first category listing it wins
+_OBJECT_MEMBER_CATEGORY: Dict[str, str] = {}
+for _category, _members in OBJECT_SYNONYMS.items():
+    for _member in _members:
+        _OBJECT_MEMBER_CATEGORY.setdefault(_member, _category)
+
+# Action -> every category it belongs to, for same-category checks
+_ACTION_CATEGORIES: Dict[str, FrozenSet[str]] = {}
+for _canonical, _members in ACTION_SYNONYMS.items():
+    for _term in (_canonical, *_members):
+        _ACTION_CATEGORIES[_term] = _ACTION_CATEGORIES.get(_term, frozenset()) | {_canonical}
+
+
+@lru_cache(maxsize=1024)
+def tokenize_query(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Lowercase/strip a query and split it into words.
+    
+    Cached, so the parser and expansion steps handling the same query share
+    one tokenization.
+    """
+    query_lower = query.lower().strip()
+    return query_lower, tuple(query_lower.split())
+
+
+@lru_cache(maxsize=4096)
 def normalize_object(obj: str) -> str:
     """Normalize an object name to canonical form."""
     obj_lower = obj.lower().strip()
     
-    for canonical, synonyms in OBJECT_SYNONYMS.items():
-        if obj_lower == canonical or obj_lower in synonyms:
-            return canonical
-    
-    return obj_lower
+    return _OBJECT_CANONICAL.get(obj_lower, obj_lower)
 
 
 def normalize_action(action: str) -> Optional[str]:
@@ -53,11 +91,7 @@ def normalize_action(action: str) -> Optional[str]:
     
     action_lower = action.lower().strip()
     
-    for canonical, synonyms in ACTION_SYNONYMS.items():
-        if action_lower == canonical or action_lower in synonyms:
-            return canonical
-    
-    return action_lower
+    return _ACTION_CANONICAL.get(action_lower, action_lower)
 
 
 def normalize_time(time: str) -> Optional[str]:
@@ -67,11 +101,7 @@ def normalize_time(time: str) -> Optional[str]:
     
     time_lower = time.lower().strip()
     
-    for canonical, synonyms in TIME_SYNONYMS.items():
-        if time_lower == canonical or time_lower in synonyms:
-            return canonical
-    
-    return time_lower
+    return _TIME_CANONICAL.get(time_lower, time_lower)
 
 
 def normalize_scene(scene: str) -> Optional[str]:
@@ -81,11 +111,7 @@ def normalize_scene(scene: str) -> Optional[str]:
     
     scene_lower = scene.lower().strip()
     
-    for canonical, synonyms in SCENE_SYNONYMS.items():
-        if scene_lower == canonical or scene_lower in synonyms:
-            return canonical
-    
-    return scene_lower
+    return _SCENE_CANONICAL.get(scene_lower, scene_lower)
 
 
 def normalize_metadata(metadata: Dict) -> Dict:
@@ -116,20 +142,23 @@ def normalize_metadata(metadata: Dict) -> Dict:
     return normalized
 
 
-def get_object_hierarchy(obj: str) -> List[str]:
-    """Get hierarchy of object categories (specific → general)."""
+@lru_cache(maxsize=4096)
+def get_object_hierarchy(obj: str) -> Tuple[str, ...]:
+    """Get hierarchy of object categories (specific → general). Cached, so returned as a tuple."""
     obj_lower = obj.lower()
     
     # Check if it's a specific type of a category
-    for category, members in OBJECT_SYNONYMS.items():
-        if obj_lower in members:
-            return [obj_lower, category]
-    
-    # Check if it's already a category
-    if obj_lower in OBJECT_SYNONYMS:
-        return [obj_lower]
+    category = _OBJECT_MEMBER_CATEGORY.get(obj_lower)
+    if category is not None:
+        return (obj_lower, category)
     
-    return [obj_lower]
+    # Already a category, or unknown
+    return (obj_lower,)
+
+
+def get_object_category(obj: str) -> Optional[str]:
+    """Category an object is a specific type of (man → person), or None."""
+    return _OBJECT_MEMBER_CATEGORY.get(obj)
 
 
 def get_action_similarity(action1: Optional[str], action2: Optional[str]) -> float:
@@ -149,10 +178,9 @@ def get_action_similarity(action1: Optional[str], action2: Optional[str]) -> flo
         return 1.0
     
     # Check if they're in the same category
-    for canonical, synonyms in ACTION_SYNONYMS.items():
-        a1_match = a1 == canonical or a1 in synonyms
-        a2_match = a2 == canonical or a2 in synonyms
-        if a1_match and a2_match:
-            return 0.8
+    a1_categories = _ACTION_CATEGORIES.get(a1)
+    a2_categories = _ACTION_CATEGORIES.get(a2)
+    if a1_categories and a2_categories and not a1_categories.isdisjoint(a2_categories):
+        return 0.8
     
     return 0.0
@@ -3,6 +3,8 @@ Test BM25 scores for "group of friends people men" query
 to determine optimal MIN_BM25_SCORE threshold
 """
 import sys
+import tempfile
+from pathlib import Path
 sys.path.append('.')
 
 from bm25_matcher import BM25Matcher
@@ -18,9 +20,14 @@ descriptions = [
 
 query = "group of friends people men"
 
-# Create BM25 matcher
-matcher = BM25Matcher()
-matcher.index_documents(descriptions)
+# Create BM25 matcher, reusing the index saved by a previous run
+INDEX_PATH = Path(tempfile.gettempdir()) / "bm25_threshold_index.npz"
+try:
+    matcher = BM25Matcher.load(INDEX_PATH)
+except OSError:
+    matcher = BM25Matcher()
+if matcher.index_documents(descriptions):
+    matcher.save(INDEX_PATH)
 
 # Get scores
 results = matcher.search(query, top_k=len(descriptions))
@@ -2,11 +2,26 @@
 Test SmolVLM 2.2B model for Deep Search.
 Compares performance and quality with the 500M model.
 """
+import perf_init  # noqa: F401  (sets torch perf flags before CUDA init)
 import sys
 import time
+import multiprocessing as mp
 from PIL import Image
 import torch
 from transformers import AutoProcessor, AutoModelForVision2Seq, BitsAndBytesConfig
+from transformers.utils import is_flash_attn_2_available, is_optimum_quanto_available
+
+# Fused attention kernels; SDPA when flash-attn isn't installed
+ATTN_IMPLEMENTATION = "flash_attention_2" if is_flash_attn_2_available() else "sdpa"
+
+# bfloat16 on Ampere+ (fp16 range overflows on long decodes), fp16 elsewhere
+HALF_DTYPE = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
+
+# Weights are already 4-bit, so the KV cache is the main decode traffic; quantize it when quanto is installed
+CACHE_KWARGS = (
+    {"cache_implementation": "quantized", "cache_config": {"backend": "quanto", "nbits": 4}}
+    if is_optimum_quanto_available() else {}
+)
 
 def test_model(image_path: str, model_name: str, model_size: str):
     """Test a VLM model on a single image."""
@@ -35,7 +50,7 @@ def test_model(image_path: str, model_name: str, model_size: str):
     
     config_4bit = BitsAndBytesConfig(
         load_in_4bit=True,
-        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_compute_dtype=HALF_DTYPE,
         bnb_4bit_use_double_quant=True,
         bnb_4bit_quant_type="nf4"
     )
@@ -44,7 +59,9 @@ def test_model(image_path: str, model_name: str, model_size: str):
     model = AutoModelForVision2Seq.from_pretrained(
         model_name,
         quantization_config=config_4bit,
-        device_map="auto"
+        torch_dtype=HALF_DTYPE,
+        device_map="auto",
+        attn_implementation=ATTN_IMPLEMENTATION
     )
     model.eval()
     
@@ -73,11 +90,13 @@ def test_model(image_path: str, model_name: str, model_size: str):
             max_new_tokens=65,
             do_sample=False,
             num_beams=1,
-            use_cache=True
+            use_cache=True,
+            **CACHE_KWARGS
         )
     
-    generated_texts = processor.batch_decode(generated_ids, skip_special_tokens=True)
-    caption = generated_texts[0].split("Assistant:")[-1].strip()
+    # Decode only the new tokens, not the prompt
+    new_tokens = generated_ids[:, inputs["input_ids"].shape[1]:]
+    caption = processor.batch_decode(new_tokens, skip_special_tokens=True)[0].strip()
     
     generation_time = time.time() - start
     
@@ -85,11 +104,6 @@ def test_model(image_path: str, model_name: str, model_size: str):
     print(f"\n📝 Description:")
     print(f"   {caption}")
     
-    # Cleanup
-    del model
-    del processor
-    torch.cuda.empty_cache()
-    
     return {
         'model': model_size,
         'load_time': load_time,
@@ -98,6 +112,14 @@ def test_model(image_path: str, model_name: str, model_size: str):
         'caption_length': len(caption)
     }
 
+def run_isolated(image_path: str, model_name: str, model_size: str) -> dict:
+    """
+    Run test_model in a fresh spawned process. Each model gets a clean CUDA
+    context and allocator, and all of its memory is released when the child exits.
+    """
+    with mp.get_context("spawn").Pool(processes=1) as pool:
+        return pool.apply(test_model, (image_path, model_name, model_size))
+
 def main(image_path: str):
     """Compare SmolVLM 500M vs 2.2B."""
     
@@ -108,7 +130,7 @@ def main(image_path: str):
     results = []
     
     # Test 1: SmolVLM-Instruct (500M) - Current
-    result1 = test_model(
+    result1 = run_isolated(
         image_path,
         "HuggingFaceTB/SmolVLM-Instruct",
         "SmolVLM-Instruct (500M)"
@@ -116,7 +138,7 @@ def main(image_path: str):
     results.append(result1)
     
     # Test 2: SmolVLM2-Instruct (2.2B) - New
-    result2 = test_model(
+    result2 = run_isolated(
         image_path,
         "HuggingFaceTB/SmolVLM2-Instruct",
         "SmolVLM2-Instruct (2.2B)"
@@ -6,7 +6,9 @@ Test different temperature values and see their impact on scores.
 import os
 import numpy as np
 from PIL import Image
-from services.embeddings import encode_text, encode_image, calibrate_siglip_score
+from services.embeddings import (
+    encode_text, encode_texts, encode_image, compute_similarity, calibrate_siglip_score, calibrate_siglip_scores
+)
 
 def interactive_tuning():
     """Interactive tool to find optimal temperature."""
@@ -17,20 +19,25 @@ def interactive_tuning():
         print(f"❌ Image directory not found: {img_path}")
         return
     
-    files = [f for f in os.listdir(img_path) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
-    if not files:
+    # Only the first image is used, so stop scanning the directory at the first match
+    with os.scandir(img_path) as entries:
+        first_image = next(
+            (e.name for e in entries if e.is_file() and e.name.lower().endswith(('.jpg', '.png', '.jpeg'))),
+            None
+        )
+    if first_image is None:
         print(f"❌ No images found in {img_path}")
         return
     
     # Load image once
-    test_img_path = os.path.join(img_path, files[0])
+    test_img_path = os.path.join(img_path, first_image)
     test_img = Image.open(test_img_path).convert("RGB")
     img_emb = encode_image(test_img)
     
     print("\n" + "=" * 80)
     print("SigLIP TEMPERATURE TUNING TOOL")
     print("=" * 80)
-    print(f"\n📷 Image: {files[0]}")
+    print(f"\n📷 Image: {first_image}")
     print("\nCommands:")
     print("  'test <query>' - Test a query with different temperatures")
     print("  'compare <query>' - Compare temperature impact for a query")
@@ -54,20 +61,15 @@ def interactive_tuning():
                 
                 # Analyze distribution
                 test_queries = ["dog", "person", "outdoor", "food", "abstract"]
-                raw_scores = []
+                raw_scores = encode_texts(test_queries) @ img_emb
                 
-                for q in test_queries:
-                    q_emb = encode_text(q)
-                    raw_sim = np.dot(img_emb, q_emb)
-                    raw_scores.append(raw_sim)
-                
-                mean_score = np.mean(raw_scores)
-                std_score = np.std(raw_scores)
+                mean_score = raw_scores.mean()
+                std_score = raw_scores.std()
                 
                 print(f"\nYour image's semantic profile:")
                 print(f"  Mean score: {mean_score:.4f}")
                 print(f"  Std dev: {std_score:.4f}")
-                print(f"  Score range: [{min(raw_scores):.4f}, {max(raw_scores):.4f}]")
+                print(f"  Score range: [{raw_scores.min():.4f}, {raw_scores.max():.4f}]")
                 
                 # Recommend temperature
                 if mean_score < -0.05:
@@ -92,9 +94,7 @@ def interactive_tuning():
                 
                 # Show preview
                 print(f"\n   Preview with temp={recommended_temp}:")
-                for q in test_queries[:3]:
-                    q_emb = encode_text(q)
-                    raw = np.dot(img_emb, q_emb)
+                for q, raw in zip(test_queries[:3], raw_scores):
                     calib = calibrate_siglip_score(raw, temperature=recommended_temp)
                     print(f"   '{q}' → {calib:.3f}")
             
@@ -110,10 +110,10 @@ def interactive_tuning():
                 print("-" * 80)
                 
                 q_emb = encode_text(query)
-                raw_sim = np.dot(img_emb, q_emb)
+                raw_sim = compute_similarity(img_emb, q_emb)
                 
-                for temp in [10, 12, 15, 18, 20, 25, 30, 35]:
-                    calib = calibrate_siglip_score(raw_sim, temperature=temp)
+                temps = np.array([10, 12, 15, 18, 20, 25, 30, 35])
+                for temp, calib in zip(temps, calibrate_siglip_scores(raw_sim, temperature=temps)):
                     print(f"{temp:<15} {raw_sim:<15.4f} {calib:<15.4f}")
             
             elif command.startswith("compare "):
@@ -123,14 +123,14 @@ def interactive_tuning():
                     continue
                 
                 q_emb = encode_text(query)
-                raw_sim = np.dot(img_emb, q_emb)
+                raw_sim = compute_similarity(img_emb, q_emb)
                 
                 print(f"\n📈 Temperature impact comparison for '{query}'")
                 print(f"Raw score: {raw_sim:.4f}")
                 print("-" * 80)
                 
-                temps = [10, 15, 20, 25, 30]
-                calibs = [calibrate_siglip_score(raw_sim, temperature=t) for t in temps]
+                temps = np.array([10, 15, 20, 25, 30])
+                calibs = calibrate_siglip_scores(raw_sim, temperature=temps)
                 
                 # ASCII bar chart
                 max_calib = max(calibs)
@@ -157,10 +157,9 @@ def interactive_tuning():
                     print(f"{'Query':<20} {'Raw Score':<15} {'Calibrated':<15}")
                     print("-" * 80)
                     
-                    for q in queries:
-                        q_emb = encode_text(q)
-                        raw = np.dot(img_emb, q_emb)
-                        calib = calibrate_siglip_score(raw, temperature=temp)
+                    raws = encode_texts(queries) @ img_emb
+                    calibs = calibrate_siglip_scores(raws, temperature=temp)
+                    for q, raw, calib in zip(queries, raws, calibs):
                         print(f"{q:<20} {raw:<15.4f} {calib:<15.4f}")
                 
                 except ValueError:
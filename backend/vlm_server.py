@@ -0,0 +1,91 @@
+"""
+Local caption server for SmolVLM2.
+Loads the VLM once and serves caption requests from other scripts over a
+multiprocessing manager socket, so iterating on prompts or thresholds
+doesn't pay a model load per run.
+
+Server:  python vlm_server.py
+Client:  from vlm_server import connect
+         captions = connect().generate(["photo1.jpg", "photo2.jpg"])
+"""
+import threading
+from multiprocessing.managers import BaseManager
+from typing import List, Optional
+from PIL import Image
+import config
+from vlm_service import get_vlm_service
+
+DEFAULT_PROMPT = "Describe this image in detail."
+
+
+class VLMManager(BaseManager):
+    """Manager exposing a single shared Captioner."""
+
+
+class Captioner:
+    """Captions image files with the server's already-loaded VLM."""
+    
+    def __init__(self, vlm_service):
+        self.vlm_service = vlm_service
+        # One generate() on the GPU at a time; each client connection gets its own thread
+        self._lock = threading.Lock()
+    
+    def _load(self, path: str) -> Optional[Image.Image]:
+        try:
+            image = Image.open(path)
+            # DCT-scaled decode for JPEGs; no-op for other formats
+            image.draft("RGB", (self.vlm_service.input_size, self.vlm_service.input_size))
+            return image.convert("RGB")
+        except Exception as e:
+            print(f">> ⚠️  Failed to load {path}: {str(e)}")
+            return None
+    
+    def generate(self, paths: List[str], prompt: str = DEFAULT_PROMPT) -> List[Optional[str]]:
+        """
+        Caption image files in VLM_BATCH_SIZE chunks.
+        
+        Args:
+            paths: Image file paths readable by the server
+            prompt: Text prompt used for every image
+            
+        Returns:
+            One caption per path (None where loading or generation failed)
+        """
+        images = [self._load(path) for path in paths]
+        loaded = [i for i, image in enumerate(images) if image is not None]
+        
+        captions: List[Optional[str]] = [None] * len(paths)
+        with self._lock:
+            for start in range(0, len(loaded), config.VLM_BATCH_SIZE):
+                chunk = loaded[start:start + config.VLM_BATCH_SIZE]
+                results = self.vlm_service.generate_captions([images[i] for i in chunk], prompt)
+                for i, caption in zip(chunk, results):
+                    captions[i] = caption
+        return captions
+
+
+def connect(port: int = config.VLM_SERVER_PORT) -> Captioner:
+    """Connect to a running server and return a proxy to its Captioner."""
+    VLMManager.register("captioner")
+    manager = VLMManager(address=("127.0.0.1", port), authkey=config.VLM_SERVER_AUTHKEY)
+    manager.connect()
+    return manager.captioner()
+
+
+def serve(port: int = config.VLM_SERVER_PORT):
+    """Load the VLM and serve caption requests until interrupted."""
+    vlm_service = get_vlm_service()
+    if not vlm_service.is_available():
+        print(">> ❌ VLM not available (ENABLE_VLM=false or load failed)")
+        return
+    
+    captioner = Captioner(vlm_service)
+    VLMManager.register("captioner", callable=lambda: captioner)
+    manager = VLMManager(address=("127.0.0.1", port), authkey=config.VLM_SERVER_AUTHKEY)
+    
+    print(f">> VLM caption server listening on 127.0.0.1:{port}")
+    manager.get_server().serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
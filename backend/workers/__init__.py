@@ -1,3 +1,3 @@
-from .processor import process_image_task
+from .processor import process_image_task, process_image_batch
 
-__all__ = ["process_image_task"]
+__all__ = ["process_image_task", "process_image_batch"]
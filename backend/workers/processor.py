@@ -1,19 +1,33 @@
 import asyncio
+import contextlib
 from datetime import datetime
+from typing import List
 from uuid import UUID
 from PIL import Image
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import numpy as np
 
-from config import DATABASE_URL, IMAGES_DIR, DEVICE
+from config import (
+    DATABASE_URL, IMAGES_DIR, DEVICE, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS,
+    FACE_BATCH_SIZE, FACE_BATCH_WAIT_MS, UPSERT_BATCH_WAIT_MS
+)
 from models import Image as ImageModel, Face, FaceCluster
-from services.embeddings import encode_image
+from services.embeddings import encode_images
 # VLM disabled for performance - using SigLIP embeddings only
 # from services.vlm import extract_metadata
 # from services.vocabulary import normalize_metadata
-from services.qdrant import upsert_image_embedding, upsert_face_embedding
+from services.qdrant import UPSERT_BATCH_SIZE, upsert_image_embeddings_batch, upsert_face_embeddings_batch
 from services.events import event_bus, StatusEvent
+from services.query_cache import query_cache
+from workers.queue import get_redis_settings
+
+# Optional libjpeg-turbo bindings; SIMD JPEG decode is several times faster than PIL's
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _turbo_jpeg = None
 
 
 # Create separate engine for background tasks
@@ -24,6 +38,26 @@ _bg_session_maker = None
 _mtcnn = None
 _resnet = None
 
+# Pending (image, future) pairs waiting for a batched SigLIP forward pass
+_embed_queue = None
+_embed_worker = None
+
+# Pending (user_id, point, future) triples waiting for a batched Qdrant upsert
+_upsert_queue = None
+_upsert_worker = None
+
+# Pending (face crops, future) pairs waiting for a batched face embedding pass
+_face_queue = None
+_face_worker = None
+
+
+def _load_rgb(file_path) -> Image.Image:
+    """Decode an image file to RGB, through libjpeg-turbo for JPEGs when it is installed."""
+    if _turbo_jpeg is not None and file_path.suffix.lower() in (".jpg", ".jpeg"):
+        with open(file_path, "rb") as f:
+            return Image.fromarray(_turbo_jpeg.decode(f.read(), pixel_format=TJPF_RGB))
+    return Image.open(file_path).convert("RGB")
+
 
 def get_bg_session_maker():
     """Get session maker for background tasks."""
@@ -66,6 +100,187 @@ def get_face_models():
     return _mtcnn, _resnet
 
 
+async def _embed_batch_loop():
+    """
+    Drain the embed queue, encoding up to EMBED_BATCH_SIZE images per forward
+    pass. After the first image arrives, waits up to EMBED_BATCH_WAIT_MS for more.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _embed_queue.get()]
+        deadline = loop.time() + EMBED_BATCH_WAIT_MS / 1000
+        while len(batch) < EMBED_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_embed_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        try:
+            # Run off the event loop so more images can queue up meanwhile
+            embeddings = await asyncio.to_thread(encode_images, [img for img, _ in batch])
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+async def embed_image(pil_image: Image.Image) -> np.ndarray:
+    """Queue an image for batched embedding and wait for its vector."""
+    global _embed_queue, _embed_worker
+    
+    if _embed_queue is None:
+        _embed_queue = asyncio.Queue()
+    if _embed_worker is None or _embed_worker.done():
+        _embed_worker = asyncio.create_task(_embed_batch_loop())
+    
+    future = asyncio.get_running_loop().create_future()
+    await _embed_queue.put((pil_image, future))
+    return await future
+
+
+def _embed_face_crops(resnet, face_batches: list) -> List[np.ndarray]:
+    """Run one InceptionResnetV1 forward over the crops of several images, returning unit vectors."""
+    import torch
+    
+    device = torch.device(DEVICE if torch.cuda.is_available() else 'cpu')
+    counts = [len(faces) for faces in face_batches]
+    
+    # L2-normalize on the device so only unit vectors cross to the host
+    with torch.inference_mode():
+        embeddings = torch.nn.functional.normalize(
+            resnet(torch.cat(face_batches).to(device)), dim=1
+        ).cpu().numpy()
+    
+    return np.split(embeddings, np.cumsum(counts)[:-1])
+
+
+async def _face_batch_loop(resnet):
+    """
+    Drain the face queue, embedding up to FACE_BATCH_SIZE crops per forward
+    pass. After the first image's crops arrive, waits up to FACE_BATCH_WAIT_MS for more.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _face_queue.get()]
+        queued = len(batch[0][0])
+        deadline = loop.time() + FACE_BATCH_WAIT_MS / 1000
+        while queued < FACE_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_face_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+            queued += len(batch[-1][0])
+        
+        try:
+            results = await asyncio.to_thread(_embed_face_crops, resnet, [faces for faces, _ in batch])
+            for (_, future), embeddings in zip(batch, results):
+                if not future.done():
+                    future.set_result(embeddings)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+async def embed_faces(resnet, faces) -> np.ndarray:
+    """Queue one image's face crops for batched embedding and wait for their vectors."""
+    global _face_queue, _face_worker
+    
+    if _face_queue is None:
+        _face_queue = asyncio.Queue()
+    if _face_worker is None or _face_worker.done():
+        _face_worker = asyncio.create_task(_face_batch_loop(resnet))
+    
+    future = asyncio.get_running_loop().create_future()
+    await _face_queue.put((faces, future))
+    return await future
+
+
+async def _upsert_batch_loop():
+    """
+    Drain the upsert queue, writing up to UPSERT_BATCH_SIZE image points per
+    request for each user. After the first point arrives, waits up to UPSERT_BATCH_WAIT_MS for more.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _upsert_queue.get()]
+        deadline = loop.time() + UPSERT_BATCH_WAIT_MS / 1000
+        while len(batch) < UPSERT_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_upsert_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        # Each user has their own collection, so group the points per user
+        by_user = {}
+        for user_id, point, future in batch:
+            by_user.setdefault(user_id, []).append((point, future))
+        
+        for user_id, entries in by_user.items():
+            try:
+                await upsert_image_embeddings_batch(user_id, [point for point, _ in entries])
+                for _, future in entries:
+                    if not future.done():
+                        future.set_result(None)
+            except Exception as e:
+                for _, future in entries:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+async def store_image_embedding(user_id: str, image_id: str, embedding: np.ndarray, metadata: dict) -> None:
+    """Queue an image point for a batched Qdrant upsert and wait until it is written."""
+    global _upsert_queue, _upsert_worker
+    
+    if _upsert_queue is None:
+        _upsert_queue = asyncio.Queue()
+    if _upsert_worker is None or _upsert_worker.done():
+        _upsert_worker = asyncio.create_task(_upsert_batch_loop())
+    
+    future = asyncio.get_running_loop().create_future()
+    await _upsert_queue.put((user_id, (image_id, embedding, metadata), future))
+    await future
+
+
+async def process_image_batch(image_ids: List[str]):
+    """
+    Process several uploaded images concurrently so their embeddings
+    share forward passes.
+    """
+    for i in range(0, len(image_ids), EMBED_BATCH_SIZE):
+        chunk = image_ids[i:i + EMBED_BATCH_SIZE]
+        await asyncio.gather(*(process_image_task(image_id) for image_id in chunk))
+
+
+async def process_image(ctx, image_id: str):
+    """arq job entry point."""
+    await process_image_task(image_id)
+
+
+class WorkerSettings:
+    """
+    arq worker config. Run with: arq workers.processor.WorkerSettings
+    
+    Allowing EMBED_BATCH_SIZE concurrent jobs lets their embeddings be
+    batched into shared forward passes.
+    """
+    functions = [process_image]
+    redis_settings = get_redis_settings()
+    max_jobs = EMBED_BATCH_SIZE
+
+
 async def process_image_task(image_id: str):
     """
     Background task to process an uploaded image.
@@ -83,6 +298,8 @@ async def process_image_task(image_id: str):
     
     session_maker = get_bg_session_maker()
     
+    faces_task = None
+    
     async with session_maker() as db:
         try:
             total_start = time.time()
@@ -103,14 +320,20 @@ async def process_image_task(image_id: str):
             
             print(f"🔄 Processing image: {image_id}")
             
-            # Load image file
+            # Load image file off the event loop
             file_path = IMAGES_DIR.parent / image.file_path
-            pil_image = Image.open(file_path).convert("RGB")
+            pil_image = await asyncio.to_thread(_load_rgb, file_path)
+            
+            # Face detection only needs the pixels, so run it alongside embedding and storage
+            face_start = time.time()
+            faces_task = asyncio.create_task(
+                process_faces_for_image(image_id, pil_image, str(image.owner_id))
+            )
             
             # Step 1: Generate SigLIP embedding
             step_start = time.time()
             print(f"  📊 Generating embedding...")
-            embedding = encode_image(pil_image)
+            embedding = await embed_image(pil_image)
             embedding_time = time.time() - step_start
             print(f"     ⏱️ Embedding: {embedding_time:.2f}s")
             
@@ -135,13 +358,14 @@ async def process_image_task(image_id: str):
             # Step 4: Upsert to Qdrant
             step_start = time.time()
             print(f"  💾 Storing in Qdrant...")
-            await upsert_image_embedding(
+            await store_image_embedding(
                 user_id=str(image.owner_id),
                 image_id=image_id,
                 embedding=embedding,
                 metadata=metadata
             )
             qdrant_time = time.time() - step_start
+            await query_cache.invalidate_user(str(image.owner_id))
             print(f"     ⏱️ Qdrant: {qdrant_time:.2f}s")
             
             # Step 5: Update database
@@ -158,11 +382,10 @@ async def process_image_task(image_id: str):
             total_time = time.time() - total_start
             print(f"✅ Completed: {image_id} (Total: {total_time:.2f}s)")
             
-            # Step 6: Process faces in background (non-blocking)
-            step_start = time.time()
+            # Step 6: Wait for the face pipeline started after loading
             try:
-                await process_faces_for_image(image_id, pil_image, str(image.owner_id))
-                face_time = time.time() - step_start
+                await faces_task
+                face_time = time.time() - face_start
                 print(f"     ⏱️ Faces: {face_time:.2f}s")
             except Exception as e:
                 print(f"  ⚠️ Face processing failed (non-critical): {e}")
@@ -170,6 +393,12 @@ async def process_image_task(image_id: str):
         except Exception as e:
             print(f"❌ Error processing {image_id}: {e}")
             
+            # Don't keep adding faces for an image that is about to be marked failed
+            if faces_task is not None:
+                faces_task.cancel()  # no-op if it already finished; awaiting still retrieves its error
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await faces_task
+            
             # Update status to failed
             try:
                 result = await db.execute(
@@ -190,6 +419,18 @@ async def process_image_task(image_id: str):
                 pass
 
 
+def _detect_faces(mtcnn, pil_image: Image.Image):
+    """Return (boxes, face crops) from one MTCNN pass, or (None, None) when no face is found."""
+    # Detect faces and get bounding boxes
+    boxes, probs = mtcnn.detect(pil_image)
+    
+    if boxes is None or len(boxes) == 0:
+        return None, None
+    
+    # Crop the detected boxes without running detection a second time
+    return boxes, mtcnn.extract(pil_image, boxes, save_path=None)
+
+
 async def process_faces_for_image(image_id: str, pil_image: Image.Image, owner_id: str):
     """
     Background task to detect and process faces using facenet-pytorch.
@@ -200,8 +441,6 @@ async def process_faces_for_image(image_id: str, pil_image: Image.Image, owner_i
     3. Store in Qdrant
     4. Create face records in database
     """
-    import torch
-    
     mtcnn, resnet = get_face_models()
     if mtcnn is None or resnet is None:
         return
@@ -209,57 +448,45 @@ async def process_faces_for_image(image_id: str, pil_image: Image.Image, owner_i
     session_maker = get_bg_session_maker()
     
     try:
-        # Detect faces and get bounding boxes
-        boxes, probs = mtcnn.detect(pil_image)
+        # Detect faces and crop them off the event loop, so embedding and storage can proceed
+        boxes, faces = await asyncio.to_thread(_detect_faces, mtcnn, pil_image)
         
-        if boxes is None or len(boxes) == 0:
-            return
-        
-        # Get face crops for embedding
-        faces = mtcnn(pil_image)
-        
-        if faces is None:
+        if boxes is None or faces is None:
             return
         
         print(f"  👤 Found {len(faces)} face(s)")
         
-        # Move faces to same device as model and generate embeddings
-        device = torch.device(DEVICE if torch.cuda.is_available() else 'cpu')
-        faces = faces.to(device)
-        
-        # Generate embeddings
-        with torch.no_grad():
-            embeddings = resnet(faces).cpu().numpy()
+        # Generate embeddings, sharing a forward pass with other images in flight
+        embeddings = await embed_faces(resnet, faces)
         
         async with session_maker() as db:
-            for i, (box, embedding) in enumerate(zip(boxes, embeddings)):
-                # Normalize embedding
-                embedding = embedding / np.linalg.norm(embedding)
-                
+            face_records = []
+            for box in boxes:
                 # Get bounding box
                 x1, y1, x2, y2 = box.astype(int)
                 
                 # Create face record
                 face_record = Face(
                     image_id=UUID(image_id),
-                    bbox_x=str(max(0, x1)),
-                    bbox_y=str(max(0, y1)),
-                    bbox_width=str(max(0, x2 - x1)),
-                    bbox_height=str(max(0, y2 - y1))
+                    bbox_x=int(max(0, x1)),
+                    bbox_y=int(max(0, y1)),
+                    bbox_width=int(max(0, x2 - x1)),
+                    bbox_height=int(max(0, y2 - y1))
                 )
                 db.add(face_record)
-                await db.flush()
-                
-                # Store face embedding in Qdrant
-                await upsert_face_embedding(
-                    user_id=owner_id,
-                    face_id=str(face_record.id),
-                    embedding=embedding,
-                    metadata={
-                        "image_id": image_id,
-                        "face_id": str(face_record.id)
-                    }
-                )
+                face_records.append(face_record)
+            
+            # One flush assigns ids to every face
+            await db.flush()
+            
+            # Store all face embeddings in Qdrant in one request
+            await upsert_face_embeddings_batch(
+                owner_id,
+                [
+                    (str(face_record.id), embedding, {"image_id": image_id, "face_id": str(face_record.id)})
+                    for face_record, embedding in zip(face_records, embeddings)
+                ]
+            )
             
             await db.commit()
             print(f"  ✅ Processed {len(faces)} faces for image {image_id}")
@@ -0,0 +1,34 @@
+"""
+arq task queue for moving image processing out of the API process.
+"""
+from typing import List, Optional
+
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+
+from config import REDIS_HOST, REDIS_PORT
+
+# Global pool cache
+_pool: Optional[ArqRedis] = None
+
+
+def get_redis_settings() -> RedisSettings:
+    """Redis connection settings shared by the API and the worker."""
+    return RedisSettings(host=REDIS_HOST, port=REDIS_PORT)
+
+
+async def get_task_pool() -> ArqRedis:
+    """Get or create the arq Redis pool (singleton)."""
+    global _pool
+    
+    if _pool is None:
+        _pool = await create_pool(get_redis_settings())
+    
+    return _pool
+
+
+async def enqueue_image_processing(image_ids: List[str]) -> None:
+    """Queue one processing job per uploaded image."""
+    pool = await get_task_pool()
+    for image_id in image_ids:
+        await pool.enqueue_job("process_image", image_id)